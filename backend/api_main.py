@@ -1,18 +1,36 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import os
-import itertools
+import time
+import json
 import logging
 from src.models import db, Story, Studiable, SentencePair
-from src.gemini_client import generate_text, synthesize_tts, async_tts_gemini 
-from src.tts import save_audio_bytes, get_audio_fname, get_audio_write_fname
+from src.storage import get_storage
+from src.indexes import index
+from src.jobs import get_job_queue, QueueFull, PRIORITIES
+from src.events import events
+from src.bundles import build_studiable_bundles
+from src.metrics import registry, errors
+from src.llm_cache import get_llm_cache
+from src.tts import tts_cache_stats
+from src.tts_limiter import tts_limiter
+from src.gemini_client import generate_text, generate_text_stream, generate_structured, async_tts_gemini, async_tts_gemini_batch, warm_clients
+from src.tts import get_audio_fname, get_audio_write_fname, audio_fname_hash, find_audio_file, migrate_audio_layout
+from src.tts import AUDIO_PROFILES, negotiate_profiles, variant_fname
 from src.prompts import build_new_story_prompt, build_next_chapter_prompt, build_quiz_prompt, build_translation_prompt, build_title_prompt
+from src.prompts import SENTENCE_PAIRS_SCHEMA, build_aligned_output_instructions, parse_sentence_pairs
+from src.prompts import build_summary_prompt
+from src.story_context import build_story_context, CONTEXT_RECENT_SENTENCES, SUMMARY_MAX_WORDS
 import asyncio
-from threading import Thread
+from bisect import bisect_right
+from collections import deque
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock, Thread
 
 
 logging.basicConfig(
@@ -22,10 +40,21 @@ logging.basicConfig(
 
 
 app = FastAPI(title="Aprendia API", version="1.0.0")
-MAX_CONCURRENT = 5
+SSE_KEEPALIVE_SECONDS = 15
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# "per_sentence" makes one TTS request per sentence; "batched" sends one SSML
+# request per chapter and locale and splits the audio at <mark> timepoints
+TTS_MODE = os.getenv("APRENDIA_TTS_MODE", "per_sentence")
+# "serial" generates the whole chapter, then the whole translation, then audio;
+# "streaming" translates and voices each sentence as soon as Gemini writes it;
+# "fused" gets aligned source/target pairs from a single JSON-schema response
+GENERATION_MODE = os.getenv("APRENDIA_GENERATION_MODE", "serial")
+STREAM_TRANSLATION_WORKERS = int(os.getenv("APRENDIA_STREAM_TRANSLATION_WORKERS", "4"))
 
 _background_loop = None
-_tts_semaphore = None
+# TTS futures per studiable, awaited before its audio is bundled
+_pending_audio = defaultdict(list)
 
 # CORS middleware
 app.add_middleware(
@@ -38,16 +67,176 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Version", "X-Next-Cursor"],
 )
 
-# Mount static files for audio
+# Audio files are content-addressed, so responses never change (see get_audio)
 os.makedirs("static_audio", exist_ok=True)
-app.mount("/audio", StaticFiles(directory="static_audio"), name="audio")
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# A fallback served because the preferred encoding is not generated yet
+# changes once it is, so it is only cached briefly
+AUDIO_FALLBACK_CACHE_CONTROL = "public, max-age=60"
 
-# Counters for IDs
-story_counter = itertools.count(len(db['stories'])+1)
-studiable_counter = itertools.count(len(db['studiables'])+1)
-sentence_counter = itertools.count(len(db['sentences'])+1)
+storage = get_storage()
+job_queue = get_job_queue()
+
+# IDs come from the storage sequences, which every worker process shares.
+# Sentences are reserved in blocks so a chapter does not cost a write per id.
+ID_BLOCK_SIZES = {"stories": 1, "studiables": 1, "sentences": 64}
+_id_blocks = defaultdict(deque)
+_id_lock = Lock()
+
+
+def next_id(name: str) -> int:
+    """Allocate the next id for `name` (stories, studiables or sentences)."""
+    with _id_lock:
+        block = _id_blocks[name]
+        if not block:
+            block.extend(storage.allocate_ids(name, ID_BLOCK_SIZES[name]))
+        return block.popleft()
+
+
+# Seconds between pulls of changes made by other worker processes
+SYNC_INTERVAL = float(os.getenv("APRENDIA_SYNC_INTERVAL", "1.0"))
+# Requests under these paths sync first (except event streams); audio,
+# health, metrics and jobs rely on the interval sync
+SYNCED_PATHS = ("/stories", "/studiables")
+_sync_lock = Lock()
+_last_sync = 0.0  # monotonic start time of the latest sync
+
+# Metrics (see GET /metrics)
+tts_semaphore_wait = registry.histogram(
+    "aprendia_tts_semaphore_wait_seconds",
+    "Time TTS tasks wait for a slot under the adaptive concurrency limit.",
+)
+tts_inflight = registry.gauge(
+    "aprendia_tts_inflight",
+    "TTS tasks currently holding a concurrency slot.",
+)
+background_tasks = registry.gauge(
+    "aprendia_background_tasks",
+    "TTS tasks submitted to the background loop and not yet finished.",
+)
+registry.callback(
+    "aprendia_job_queue_depth", "Generation jobs waiting for a worker.", "gauge",
+    lambda: [({}, job_queue.depth())],
+)
+registry.callback(
+    "aprendia_jobs", "Generation jobs in the shared queue, by status.", "gauge",
+    lambda: [({"status": k}, v) for k, v in sorted(job_queue.stats()["jobs"].items())],
+)
+registry.callback(
+    "aprendia_tts_cache_total", "TTS audio cache lookups by result.", "counter",
+    lambda: [({"result": k}, v) for k, v in tts_cache_stats.items()],
+)
+registry.callback(
+    "aprendia_llm_cache_total", "LLM response cache lookups by result.", "counter",
+    lambda: [({"result": k}, v) for k, v in get_llm_cache().stats.items()],
+)
+
+
+def _hit_ratio(hits: int, total: int) -> list:
+    return [({}, hits / total if total else 0.0)]
+
+
+registry.callback(
+    "aprendia_tts_cache_hit_ratio", "Share of TTS lookups served without synthesis.", "gauge",
+    lambda: _hit_ratio(tts_cache_stats["hits"] + tts_cache_stats["deduped"],
+                       sum(tts_cache_stats.values())),
+)
+registry.callback(
+    "aprendia_llm_cache_hit_ratio", "Share of LLM lookups served from cache.", "gauge",
+    lambda: _hit_ratio(get_llm_cache().stats["memory_hits"] + get_llm_cache().stats["disk_hits"],
+                       sum(get_llm_cache().stats.values())),
+)
+registry.callback(
+    "aprendia_sse_subscribers", "Open story event streams.", "gauge",
+    lambda: [({}, events.subscriber_count())],
+)
+
+
+@app.on_event("startup")
+def load_storage():
+    """Load persisted state into `db` and continue ID allocation after it."""
+    storage.load_into(db)
+    index.rebuild(db)
+    for block in _id_blocks.values():
+        block.clear()
+    # Workers start after state is loaded so resumed jobs can find their studiables
+    job_queue.start()
+    if SYNC_INTERVAL > 0:
+        Thread(target=_sync_loop, daemon=True).start()
+
+
+def sync_shared_state(since: Optional[float] = None):
+    """
+    Pull stories and studiables saved by other worker processes into `db`.
+    
+    Each process serves requests from its own copy of the data; this keeps
+    that copy, the indexes and the event streams in step with the database.
+    With `since` (a time.monotonic() value), a sync that started after it
+    already covers the caller and none is run.
+    """
+    global _last_sync
+    with _sync_lock:
+        if since is not None and _last_sync >= since:
+            return
+        _last_sync = time.monotonic()
+        for kind, obj, previous in storage.sync(db):
+            if kind == "story":
+                if previous is None:
+                    index.add_story(obj.id)
+                else:
+                    index.touch_story(obj.id)
+                continue
+            if previous is None:
+                index.add_studiable(obj)
+                events.publish(obj.story_id, "studiable_created", studiable_id=obj.id)
+            index.set_sentences(obj)
+            if previous is not None:
+                _drop_sentences(previous.sentence_ids, obj)
+            finished = lambda s: bool(s.sentence_ids or s.metadata.get("error"))  # noqa: E731
+            if finished(obj) and not (previous and finished(previous)):
+                _publish_finished(obj)
+            if "audio_bundles" in obj.metadata and not (
+                previous and "audio_bundles" in previous.metadata
+            ):
+                events.publish(obj.story_id, "audio_bundle_ready", studiable_id=obj.id)
+
+
+def _sync_loop():
+    while True:
+        time.sleep(SYNC_INTERVAL)
+        try:
+            sync_shared_state()
+        except Exception as e:
+            logging.warning(f"Could not sync shared state: {e}")
+
+
+@app.middleware("http")
+async def sync_before_request(request: Request, call_next):
+    """Serve story and studiable reads from state that includes other workers' saved changes."""
+    path = request.url.path
+    if path.startswith(SYNCED_PATHS) and not path.endswith("/events"):
+        # Requests arriving together share one sync instead of queueing for their own
+        await asyncio.to_thread(sync_shared_state, time.monotonic())
+    return await call_next(request)
+
+
+@app.on_event("startup")
+def warm_api_clients():
+    """
+    Optionally authenticate and create the pooled Gemini/TTS clients in the
+    background, so the first request does not pay for it. Startup never waits.
+    """
+    if os.getenv("APRENDIA_WARM_CLIENTS", "0") == "1":
+        Thread(target=warm_clients, daemon=True).start()
+
+
+@app.on_event("shutdown")
+def close_storage():
+    job_queue.stop()
+    storage.close()
 
 
 # Request/Response Models
@@ -61,6 +250,7 @@ class CreateStoryRequest(BaseModel):
     conversation_type: str
     min_sentence_length: int
     max_sentence_length: int
+    priority: str = "interactive"  # "interactive" or "bulk" (pre-generation)
 
 
 class CreateStudiableRequest(BaseModel):
@@ -72,6 +262,7 @@ class CreateStudiableRequest(BaseModel):
     min_sentence_length: Optional[int] = None
     max_sentence_length: Optional[int] = None
     parent_studiable_id: Optional[int] = None  # For quizzes, the chapter ID
+    priority: str = "interactive"  # "interactive" or "bulk" (pre-generation)
 
 
 # Health check
@@ -87,12 +278,14 @@ def root():
 
 # Story endpoints
 @app.post("/stories")
-def create_story(request: CreateStoryRequest, background_tasks: BackgroundTasks):
+def create_story(request: CreateStoryRequest):
     """
     Create a new story with chapter 1.
-    This endpoint creates the story and immediately starts generating chapter 1.
+    This endpoint creates the story and immediately queues generation of chapter 1.
     If title is not provided, generates one using Gemini.
     """
+    priority = _check_queue(request.priority)
+    
     # Generate title if not provided
     title = request.title
     if not title or title.strip() == "":
@@ -103,15 +296,16 @@ def create_story(request: CreateStoryRequest, background_tasks: BackgroundTasks)
                 request.age_level,
                 request.conversation_type
             )
-            title = generate_text(title_prompt).strip()
+            title = generate_text(title_prompt, cache=False, kind="title").strip()
             # Remove any quotes that Gemini might add
             title = title.strip('"').strip("'")
         except Exception as e:
             print(f"Error generating title: {e}")
+            errors.inc(stage="title")
             # Fallback to a default title
             title = f"{request.topic.capitalize()} Story"
     
-    story_id = next(story_counter)
+    story_id = next_id("stories")
     story = Story(
         id=story_id,
         title=title,
@@ -124,53 +318,109 @@ def create_story(request: CreateStoryRequest, background_tasks: BackgroundTasks)
         }
     )
     db["stories"][story_id] = story
+    index.add_story(story_id)
+    storage.save_story(story)
     
     # Create chapter 1
-    studiable_id = next(studiable_counter)
-    studiable = Studiable(
-        id=studiable_id,
-        story_id=story_id,
-        title="Chapter 1",
-        raw_text="",
-        metadata={
-            "type": "chapter",
-            "chapter_number": 1,
-            "language_level": request.language_level,
-            "age_level": request.age_level,
-            "topic": request.topic,
-            "conversation_type": request.conversation_type,
-            "min_sentence_length": request.min_sentence_length,
-            "max_sentence_length": request.max_sentence_length,
-        }
-    )
-    db["studiables"][studiable_id] = studiable
+    studiable = _add_chapter(story_id, request)
+    studiable_id = studiable.id
     
     # Process chapter 1 in background
-    background_tasks.add_task(
-        process_chapter,
-        studiable,
-        story,
-        request.language_level,
-        request.age_level,
-        request.topic,
-        request.conversation_type,
-        request.min_sentence_length,
-        request.max_sentence_length,
-        None  # No previous story for chapter 1
-    )
+    job = _enqueue_generation("chapter", studiable, priority)
     
     return {
         "story": story,
         "chapter_id": studiable_id,
+        "job_id": job.id,
         "status": "processing"
     }
 
 
+def _etag(*parts) -> str:
+    """Strong ETag built from version numbers."""
+    return '"' + "-".join(str(p) for p in parts) + '"'
+
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 response if the client's If-None-Match already covers `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = [t.strip() for t in header.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def _set_version_headers(response: Response, etag: str, version: int):
+    response.headers["ETag"] = etag
+    # Pass back as ?since= to get only what changed after this response
+    response.headers["X-Version"] = str(version)
+
+
+def _parse_fields(fields: Optional[str], cls) -> Optional[List[str]]:
+    """Parse a comma-separated `fields=` projection against the fields of `cls`."""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    allowed = set(cls.FIELDS)
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def _project(obj, fields: Optional[List[str]]):
+    return obj.to_dict(fields)
+
+
+def _paginate(ids: List[int], cursor: Optional[int], limit: int, keep=None):
+    """
+    Page through ascending `ids`, starting after `cursor`.
+    
+    Returns (page, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    start = bisect_right(ids, cursor) if cursor is not None else 0
+    page = []
+    for pos in range(start, len(ids)):
+        item_id = ids[pos]
+        if keep is not None and not keep(item_id):
+            continue
+        if len(page) == limit:
+            return page, page[-1]
+        page.append(item_id)
+    return page, None
+
+
 @app.get("/stories")
-def list_stories():
-    """Get all stories."""
-    logging.info(f"{db}")
-    return list(db["stories"].values())
+def list_stories(
+    request: Request,
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None
+):
+    """
+    Get stories, oldest first, one page at a time.
+    
+    Pass the X-Next-Cursor response header back as `cursor` for the next
+    page; `fields` is a comma-separated projection (e.g. `id,title`).
+    """
+    field_list = _parse_fields(fields, Story)
+    version = index.stories_version
+    etag = _etag("stories", version, cursor or 0, limit, fields or "")
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    _set_version_headers(response, etag, version)
+    
+    page, next_cursor = _paginate(index.story_ids, cursor, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    
+    logging.info(f"list_stories: {len(page)} of {len(db['stories'])} stories (cursor={cursor})")
+    return [_project(db["stories"][sid], field_list) for sid in page]
 
 
 @app.get("/stories/{story_id}")
@@ -186,8 +436,7 @@ def get_story(story_id: int):
 @app.post("/stories/{story_id}/studiables")
 def create_studiable(
     story_id: int,
-    request: CreateStudiableRequest,
-    background_tasks: BackgroundTasks
+    request: CreateStudiableRequest
 ):
     """
     Create a new studiable (chapter or quiz) for a story.
@@ -195,59 +444,23 @@ def create_studiable(
     story = db["stories"].get(story_id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
-    
-    studiable_id = next(studiable_counter)
+    if request.type not in ("chapter", "quiz"):
+        raise HTTPException(status_code=400, detail="Invalid studiable type")
+    priority = _check_queue(request.priority)
     
     if request.type == "chapter":
-        # Get existing chapters to determine chapter number
-        existing_chapters = [
-            s for s in db["studiables"].values()
-            if s.story_id == story_id and s.metadata.get("type") == "chapter"
-        ]
-        chapter_number = len(existing_chapters) + 1
-        
-        studiable = Studiable(
-            id=studiable_id,
-            story_id=story_id,
-            title=f"Chapter {chapter_number}",
-            raw_text="",
-            metadata={
-                "type": "chapter",
-                "chapter_number": chapter_number,
-                "language_level": request.language_level,
-                "age_level": request.age_level,
-                "topic": request.topic,
-                "conversation_type": request.conversation_type,
-                "min_sentence_length": request.min_sentence_length,
-                "max_sentence_length": request.max_sentence_length,
-            }
-        )
-        db["studiables"][studiable_id] = studiable
+        studiable = _add_chapter(story_id, request)
+        studiable_id = studiable.id
         
-        # Get previous story text for continuation
-        previous_story = "\n".join([
-            s.raw_text for s in existing_chapters if s.raw_text
-        ])
+        job = _enqueue_generation("chapter", studiable, priority)
         
-        background_tasks.add_task(
-            process_chapter,
-            studiable,
-            story,
-            request.language_level,
-            request.age_level,
-            request.topic,
-            request.conversation_type,
-            request.min_sentence_length,
-            request.max_sentence_length,
-            previous_story if previous_story else None
-        )
-        
-    elif request.type == "quiz":
+    else:
         # Get the parent chapter
         parent_studiable = db["studiables"].get(request.parent_studiable_id)
         if not parent_studiable:
             raise HTTPException(status_code=404, detail="Parent chapter not found")
         
+        studiable_id = next_id("studiables")
         studiable = Studiable(
             id=studiable_id,
             story_id=story_id,
@@ -260,91 +473,602 @@ def create_studiable(
             }
         )
         db["studiables"][studiable_id] = studiable
+        index.add_studiable(studiable)
         
-        background_tasks.add_task(
-            process_quiz,
-            studiable,
-            story,
-            parent_studiable
-        )
-    
-    else:
-        raise HTTPException(status_code=400, detail="Invalid studiable type")
+        job = _enqueue_generation("quiz", studiable, priority)
     
     return {
         "studiable_id": studiable_id,
+        "job_id": job.id,
         "status": "processing"
     }
 
 
 @app.get("/stories/{story_id}/studiables")
-def list_studiables(story_id: int):
-    """Get all studiables (chapters and quizzes) for a story."""
+def list_studiables(
+    story_id: int,
+    request: Request,
+    response: Response,
+    since: Optional[int] = None,
+    cursor: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None
+):
+    """
+    Get studiables (chapters and quizzes) for a story, one page at a time.
+    
+    With `since`, only studiables changed after that version are returned.
+    Pagination and `fields` projection work as for `GET /stories`.
+    """
     story = db["stories"].get(story_id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
     
-    studiables = [
-        s for s in db["studiables"].values()
-        if s.story_id == story_id
-    ]
+    field_list = _parse_fields(fields, Studiable)
+    version = index.story_versions.get(story_id, 0)
+    etag = _etag("story", story_id, version, since or 0, cursor or 0, limit, fields or "")
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    _set_version_headers(response, etag, version)
+    
+    keep = None
+    if since is not None:
+        keep = lambda sid: index.studiable_versions.get(sid, 0) > since  # noqa: E731
+    page, next_cursor = _paginate(index.studiable_ids(story_id), cursor, limit, keep)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
     
-    return studiables
+    return [_project(db["studiables"][sid], field_list) for sid in page]
 
 
 @app.get("/studiables/{studiable_id}")
-def get_studiable(studiable_id: int):
-    """Get a specific studiable with its sentences."""
+def get_studiable(
+    studiable_id: int,
+    request: Request,
+    response: Response,
+    since: Optional[int] = None
+):
+    """
+    Get a specific studiable with its sentences.
+    
+    With `since`, only sentences added after that version are returned.
+    Once all audio is ready, `metadata.audio_bundles` holds one packed file
+    per side (source/target) with each sentence's byte range and timing.
+    """
     studiable = db["studiables"].get(studiable_id)
     if not studiable:
         raise HTTPException(status_code=404, detail="Studiable not found")
     
+    version = index.studiable_versions.get(studiable_id, 0)
+    etag = _etag("studiable", studiable_id, version, since or 0)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    _set_version_headers(response, etag, version)
+    
     # Get sentences for this studiable
-    sentences = [
-        s for s in db["sentences"].values()
-        if s.id in [sent.id for sent in studiable.sentences]
-    ]
+    sentence_ids = index.sentence_ids(studiable_id)
+    if since is not None:
+        sentence_ids = index.sentence_ids_since(studiable_id, since)
+    # A sentence replaced by another worker's save can vanish mid-request
+    sentences = [sp.to_dict() for sp in map(db["sentences"].get, sentence_ids) if sp]
     
     return {
         "id": studiable.id,
         "story_id": studiable.story_id,
         "title": studiable.title,
         "metadata": studiable.metadata,
+        "version": version,
         "sentences": sentences
     }
 
 
+@app.get("/stories/{story_id}/events")
+async def story_events(story_id: int, request: Request):
+    """
+    Server-sent events for a story's generation progress.
+    
+    Each message's data is a JSON object with a `type` of studiable_created,
+    chapter_text_ready, sentence_created, audio_ready, studiable_ready or error.
+    """
+    if story_id not in db["stories"]:
+        raise HTTPException(status_code=404, detail="Story not found")
+    
+    queue = events.subscribe(story_id)
+    
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(story_id, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.on_event("startup")
+def migrate_audio():
+    """Move audio left in the old flat per-locale directories into shards."""
+    migrate_audio_layout()
+
+
+@app.api_route("/audio/{locale}/{fname}", methods=["GET", "HEAD"])
+def get_audio(locale: str, fname: str, request: Request, profile: Optional[str] = None):
+    """
+    Serve a generated audio file.
+    
+    File names are content hashes, so clients may cache responses forever
+    (`immutable`) and revalidate with the hash as a strong ETag. Byte ranges
+    are supported for seeking.
+    
+    For an MP3 URL, the `profile` query parameter (e.g. `opus`) or the
+    Accept header selects another encoding of the same audio when one has
+    been generated; otherwise the MP3 is served, with a short max-age so the
+    client picks up the preferred encoding once it exists.
+    """
+    if profile is not None and profile not in AUDIO_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown audio profile: {profile}")
+    if audio_fname_hash(locale, fname) is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    headers = {}
+    candidates = [fname]
+    if fname.endswith(".mp3"):
+        wanted = [profile] if profile else negotiate_profiles(request.headers.get("accept"))
+        candidates = [variant_fname(fname, p) for p in wanted] + candidates
+        headers["Vary"] = "Accept"
+    
+    fpath = None
+    for candidate in dict.fromkeys(candidates):
+        fpath = find_audio_file(locale, candidate)
+        if fpath is not None:
+            break
+    if fpath is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    fallback = fpath.name != candidates[0]
+    headers["Cache-Control"] = AUDIO_FALLBACK_CACHE_CONTROL if fallback else AUDIO_CACHE_CONTROL
+    headers["ETag"] = f'"{audio_fname_hash(locale, fpath.name)}"'
+    not_modified = _not_modified(request, headers["ETag"])
+    if not_modified:
+        not_modified.headers.update(headers)
+        return not_modified
+    media_type = {f".{p.extension}": p.media_type for p in AUDIO_PROFILES.values()}[fpath.suffix]
+    return FileResponse(fpath, media_type=media_type, headers=headers)
+
+
+@app.get("/metrics")
+def metrics():
+    """Process metrics in the Prometheus text exposition format."""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# Job endpoints
+@app.get("/jobs")
+def get_job_stats():
+    """Get queue depth, worker count and job counts by status."""
+    return job_queue.stats()
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: int):
+    """Get the status of a generation job."""
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _check_queue(priority_name: str) -> int:
+    """Validate a request priority and refuse new work when the queue is full."""
+    priority = PRIORITIES.get(priority_name)
+    if priority is None:
+        raise HTTPException(status_code=400, detail="Invalid priority")
+    if job_queue.depth() >= job_queue.max_depth:
+        raise HTTPException(status_code=503, detail="Generation queue is full, try again later")
+    return priority
+
+
+def _add_chapter(story_id: int, request) -> Studiable:
+    """
+    Create and save the next chapter of a story with the generation
+    parameters of `request` (a story or studiable creation request).
+
+    The chapter number comes from storage, which allocates it in the same
+    transaction as the insert, so worker processes never hand out one twice.
+    """
+    studiable_id = next_id("studiables")
+
+    def build(chapter_number: int) -> Studiable:
+        return Studiable(
+            id=studiable_id,
+            story_id=story_id,
+            title=f"Chapter {chapter_number}",
+            raw_text="",
+            metadata={
+                "type": "chapter",
+                "chapter_number": chapter_number,
+                "language_level": request.language_level,
+                "age_level": request.age_level,
+                "topic": request.topic,
+                "conversation_type": request.conversation_type,
+                "min_sentence_length": request.min_sentence_length,
+                "max_sentence_length": request.max_sentence_length,
+            }
+        )
+
+    studiable = storage.add_chapter(story_id, build)
+    db["studiables"][studiable_id] = studiable
+    index.add_studiable(studiable)
+    return studiable
+
+
+def _enqueue_generation(kind: str, studiable: Studiable, priority: int):
+    """Queue generation for a new studiable and record the job id in its metadata."""
+    # Saved first: a worker in another process may pick up the job right away
+    storage.save_studiable(studiable)
+    try:
+        job = job_queue.enqueue(kind, {"studiable_id": studiable.id}, priority)
+    except QueueFull as e:
+        studiable.metadata["error"] = str(e)
+        storage.save_studiable(studiable)
+        # New version and error event, so pollers holding the old ETag see the failure
+        _publish_finished(studiable)
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    studiable.metadata["job_id"] = job.id
+    index.touch_studiable(studiable)
+    storage.save_studiable(studiable)
+    events.publish(studiable.story_id, "studiable_created", studiable_id=studiable.id)
+    return job
+
+
+def _drop_sentences(old_ids, studiable: Studiable):
+    """
+    Remove sentences among `old_ids` that `studiable` no longer references.
+
+    Called after the studiable and the index have moved to their new ids, so
+    a concurrent reader never looks up a sentence that is already gone.
+    """
+    keep = set(studiable.sentence_ids)
+    for sid in old_ids:
+        if sid not in keep:
+            db["sentences"].pop(sid, None)
+
+
+def _reset_studiable(studiable: Studiable):
+    """Drop output from an earlier, interrupted attempt before regenerating."""
+    old_ids = studiable.sentence_ids
+    studiable.sentences = []
+    index.set_sentences(studiable)
+    _drop_sentences(old_ids, studiable)
+    studiable.metadata.pop("error", None)
+    studiable.metadata.pop("audio_bundles", None)
+
+
+class GenerationFailed(Exception):
+    """Raised by the job handlers so the queue records a failed generation."""
+
+
+def _raise_if_failed(studiable: Studiable):
+    error = studiable.metadata.get("error")
+    if error:
+        raise GenerationFailed(f"Studiable {studiable.id}: {error}")
+
+
+def run_chapter_job(payload: dict):
+    """Job handler: (re)generate a chapter from the parameters stored on it."""
+    sync_shared_state()
+    studiable = db["studiables"].get(payload["studiable_id"])
+    if not studiable:
+        raise ValueError(f"Studiable {payload['studiable_id']} not found")
+    story = db["stories"][studiable.story_id]
+    
+    _reset_studiable(studiable)
+    
+    # Bounded context for continuation: rolling summary + latest sentences
+    previous_story = _continuation_context(story, studiable.id)
+    
+    m = studiable.metadata
+    process_chapter(
+        studiable,
+        story,
+        m.get("language_level"),
+        m.get("age_level"),
+        m.get("topic"),
+        m.get("conversation_type"),
+        m.get("min_sentence_length"),
+        m.get("max_sentence_length"),
+        previous_story if previous_story else None
+    )
+    _raise_if_failed(studiable)
+    
+    try:
+        _story_summary(story, studiable.id)
+    except Exception as e:
+        logging.warning(f"Could not update summary of story {story.id}: {e}")
+        errors.inc(stage="summary")
+
+
+_summary_locks = defaultdict(Lock)
+
+
+def _previous_chapters(story_id: int, before_id: int) -> List[Studiable]:
+    """Finished chapters of a story with ids below `before_id`, oldest first."""
+    chapters = []
+    for sid in index.studiable_ids(story_id):
+        if sid >= before_id:
+            break
+        studiable = db["studiables"][sid]
+        if studiable.metadata.get("type") == "chapter" and studiable.sentence_ids:
+            chapters.append(studiable)
+    return chapters
+
+
+def _story_summary(story: Story, through_id: int) -> str:
+    """
+    Rolling summary of a story's chapters up to and including `through_id`.
+    
+    The summary lives in the story metadata with the id of the last chapter
+    folded into it; only chapters after that are summarised, one call each.
+    """
+    with _summary_locks[story.id]:
+        m = story.metadata
+        summary = m.get("summary", "")
+        summarised = m.get("summary_through", 0)
+        if summarised > through_id:
+            # Regenerating an older chapter: the stored summary covers later
+            # chapters, so rebuild the prefix (summary calls are cached)
+            summary, summarised = "", 0
+        
+        folded = summarised
+        for chapter in _previous_chapters(story.id, through_id + 1):
+            if chapter.id <= folded:
+                continue
+            summary = generate_text(build_summary_prompt(
+                summary,
+                [sp.source_text for sp in chapter.sentences],
+                SUMMARY_MAX_WORDS
+            ), kind="summary").strip()
+            folded = chapter.id
+        
+        if folded > m.get("summary_through", 0):
+            m["summary"] = summary
+            m["summary_through"] = folded
+            index.touch_story(story.id)
+            storage.save_story(story)
+        return summary
+
+
+def _continuation_context(story: Story, studiable_id: int) -> str:
+    """Prompt context for continuing a story with chapter `studiable_id`."""
+    chapters = _previous_chapters(story.id, studiable_id)
+    if not chapters:
+        return ""
+    
+    try:
+        summary = _story_summary(story, chapters[-1].id)
+    except Exception as e:
+        logging.warning(f"Could not summarise story {story.id}: {e}")
+        summary = story.metadata.get("summary", "")
+    
+    recent = []
+    for chapter in reversed(chapters):
+        recent[:0] = [sp.source_text for sp in chapter.sentences]
+        if len(recent) >= CONTEXT_RECENT_SENTENCES:
+            break
+    return build_story_context(summary, recent)
+
+
+def run_quiz_job(payload: dict):
+    """Job handler: (re)generate a quiz for its parent chapter."""
+    sync_shared_state()
+    studiable = db["studiables"].get(payload["studiable_id"])
+    if not studiable:
+        raise ValueError(f"Studiable {payload['studiable_id']} not found")
+    story = db["stories"][studiable.story_id]
+    parent_studiable = db["studiables"][studiable.metadata["parent_studiable_id"]]
+    
+    _reset_studiable(studiable)
+    
+    process_quiz(studiable, story, parent_studiable)
+    _raise_if_failed(studiable)
+
+
+job_queue.register("chapter", run_chapter_job)
+job_queue.register("quiz", run_quiz_job)
+
+
+def _track_background(future):
+    """Count a task submitted to the background loop until it finishes."""
+    background_tasks.inc()
+    future.add_done_callback(lambda _: background_tasks.dec())
+
+
 def _ensure_background_loop():
-    """Ensure there's one global asyncio loop and semaphore for background tasks."""
-    global _background_loop, _tts_semaphore
+    """Ensure there's one global asyncio loop for background tasks."""
+    global _background_loop
     if _background_loop is None:
         _background_loop = asyncio.new_event_loop()
-        _tts_semaphore = asyncio.Semaphore(MAX_CONCURRENT)
         Thread(target=_background_loop.run_forever, daemon=True).start()
-    return _background_loop, _tts_semaphore
+    return _background_loop
+
+async def _limited_tts(locale: str, call):
+    """
+    Await `call()` (a fresh TTS coroutine per attempt) under the adaptive
+    concurrency limit and the locale's rate limit, retrying throttling and
+    transient errors (see src/tts_limiter.py). Passed as `limit` to the TTS
+    cache, so cache hits and deduplicated waits never take a slot or a token.
+    """
+    async def attempt():
+        with tts_inflight.track():
+            return await call()
+    return await tts_limiter.call(locale, attempt, wait_metric=tts_semaphore_wait)
+
+
+async def _bounded_tts(locale: str, text: str, save_path: str, story_id: Optional[int] = None):
+    """Synthesize + save one audio file within the global TTS concurrency budget."""
+    result = await async_tts_gemini(text, save_path, lang=locale, limit=partial(_limited_tts, locale))
+    if story_id is not None:
+        events.publish(story_id, "audio_ready", audio=get_audio_fname(locale, text))
+    return result
 
-async def async_synthesize_and_save(locale: str, text: str, save_path: str):
+
+def _retry_tts_later(locale: str, text: str, save_path: str, story_id: Optional[int] = None,
+                     studiable_id: Optional[int] = None):
+    """
+    Queue a failed item for another attempt once the service has recovered.
+    Must run on the background loop. When it succeeds after its studiable
+    finished, the studiable's bundles are rebuilt to include it.
+    """
+    async def retry():
+        await _bounded_tts(locale, text, save_path, story_id)
+        studiable = db["studiables"].get(studiable_id) if studiable_id is not None else None
+        if studiable is None:
+            return
+        audio_errors = studiable.metadata.get("audio_errors")
+        if audio_errors:
+            remaining = [e for e in audio_errors if e["text"] != text]
+            if remaining:
+                studiable.metadata["audio_errors"] = remaining
+            else:
+                studiable.metadata.pop("audio_errors")
+            index.touch_studiable(studiable)
+            await asyncio.to_thread(storage.save_studiable, studiable)
+        if studiable.sentence_ids and studiable_id not in _pending_audio:
+            await async_build_bundles(studiable, [])
+    tts_limiter.retry_later(str(save_path), retry)
+
+
+async def async_synthesize_and_save(locale: str, text: str, save_path: str,
+                                    story_id: Optional[int] = None,
+                                    studiable_id: Optional[int] = None):
     """Async wrapper for TTS synthesis + saving with concurrency control."""
     try:
-        _, sem = _ensure_background_loop()
-        async with sem:
-            # actually synthesize and write
-            fut = await async_tts_gemini(text, save_path, lang=locale)
-            return fut
+        return await _bounded_tts(locale, text, save_path, story_id)
     except Exception as e:
         print(f"[TTS] Error for {locale}: {e}")
+        errors.inc(stage="tts_task")
+        if story_id is not None:
+            events.publish(story_id, "error", stage="tts",
+                           audio=get_audio_fname(locale, text), error=str(e))
+        _retry_tts_later(locale, text, save_path, story_id, studiable_id)
         return None
+
+
+async def async_synthesize_all(items: List[tuple], story_id: Optional[int] = None,
+                               studiable_id: Optional[int] = None) -> list:
+    """
+    Synthesize (locale, text, save_path) items concurrently.
+    
+    Returns one result per item in order: the saved path, or the exception
+    raised for that item. Failed items are queued for a later retry.
+    """
+    results = await asyncio.gather(
+        *(_bounded_tts(locale, text, save_path, story_id) for locale, text, save_path in items),
+        return_exceptions=True
+    )
+    for (locale, text, save_path), res in zip(items, results):
+        if isinstance(res, Exception):
+            _retry_tts_later(locale, text, save_path, story_id, studiable_id)
+    return results
+
+
+def run_tts_tasks(items: List[tuple], story_id: Optional[int] = None,
+                  studiable_id: Optional[int] = None) -> list:
+    """Run `async_synthesize_all` on the background loop and wait for every item."""
+    loop = _ensure_background_loop()
+    future = asyncio.run_coroutine_threadsafe(
+        async_synthesize_all(items, story_id, studiable_id), loop
+    )
+    _track_background(future)
+    return future.result()
+
     
-def submit_tts_task(locale: str, text: str, save_path: str):
+def submit_tts_task(locale: str, text: str, save_path: str, story_id: Optional[int] = None,
+                    studiable_id: Optional[int] = None):
     """Schedules async TTS task on the background loop (non-blocking)."""
-    loop, _ = _ensure_background_loop()
+    loop = _ensure_background_loop()
+    future = asyncio.run_coroutine_threadsafe(
+        async_synthesize_and_save(locale, text, save_path, story_id, studiable_id),
+        loop
+    )
+    _track_background(future)
+    return future
+
+
+async def async_synthesize_batch_and_save(locale: str, texts: List[str], save_paths: list,
+                                          story_id: Optional[int] = None,
+                                          studiable_id: Optional[int] = None):
+    """Batched TTS for one locale; each SSML batch request takes one slot of the budget."""
+    try:
+        await async_tts_gemini_batch(texts, save_paths, lang=locale,
+                                     limit=partial(_limited_tts, locale))
+    except Exception as e:
+        print(f"[TTS] Batch error for {locale}: {e}")
+        errors.inc(stage="tts_task")
+        if story_id is not None:
+            events.publish(story_id, "error", stage="tts", error=str(e))
+        # Retry sentence by sentence, so one bad item cannot sink the batch again
+        for text, save_path in dict(zip(texts, save_paths)).items():
+            _retry_tts_later(locale, text, save_path, story_id, studiable_id)
+        return None
+    if story_id is not None:
+        for text in dict.fromkeys(texts):
+            events.publish(story_id, "audio_ready", audio=get_audio_fname(locale, text))
+
+
+def submit_tts_batch_task(locale: str, texts: List[str], save_paths: list,
+                          story_id: Optional[int] = None, studiable_id: Optional[int] = None):
+    """Schedules a batched TTS task on the background loop (non-blocking)."""
+    loop = _ensure_background_loop()
     future = asyncio.run_coroutine_threadsafe(
-        async_synthesize_and_save(locale, text, save_path),
+        async_synthesize_batch_and_save(locale, texts, save_paths, story_id, studiable_id),
         loop
     )
+    _track_background(future)
     return future
 
 
+async def async_build_bundles(studiable: Studiable, tts_futures: list):
+    """Wait for a studiable's audio, then pack it into per-side bundles."""
+    if tts_futures:
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in tts_futures),
+                             return_exceptions=True)
+    try:
+        bundles = await asyncio.to_thread(build_studiable_bundles, studiable)
+    except Exception as e:
+        print(f"[Bundle] Error for studiable {studiable.id}: {e}")
+        errors.inc(stage="bundle")
+        return
+    if not bundles:
+        return
+    studiable.metadata["audio_bundles"] = bundles
+    index.touch_studiable(studiable)
+    await asyncio.to_thread(storage.save_studiable, studiable)
+    events.publish(studiable.story_id, "audio_bundle_ready", studiable_id=studiable.id)
+
+
+def submit_bundle_task(studiable: Studiable):
+    """Schedule bundling once the studiable's submitted TTS tasks have finished."""
+    loop = _ensure_background_loop()
+    future = asyncio.run_coroutine_threadsafe(
+        async_build_bundles(studiable, _pending_audio.pop(studiable.id, [])),
+        loop
+    )
+    _track_background(future)
+    return future
+
 
 # Background processing functions
 def process_chapter(
@@ -386,54 +1110,172 @@ def process_chapter(
                 max_sentence_length
             )
         
-        # Generate story text
-        result = generate_text(prompt)
+        if GENERATION_MODE == "streaming":
+            process_chapter_streaming(studiable, story, prompt)
+            return
         
-        result_trans = generate_text(build_translation_prompt(result, story.source_locale,
-                story.target_locale))
-        studiable.raw_text = result + result_trans
+        pairs = None
+        if GENERATION_MODE == "fused":
+            try:
+                pairs = generate_sentence_pairs(prompt, story)
+                studiable.raw_text = (
+                    "\n".join(src for src, _ in pairs) + "\n".join(tgt for _, tgt in pairs)
+                )
+            except ValueError as e:
+                logging.warning(f"Fused generation failed validation ({e}); using two calls")
+        
+        if pairs is None:
+            # Generate story text (creative, so never served from cache)
+            result = generate_text(prompt, cache=False, kind="story")
+            
+            result_trans = generate_text(build_translation_prompt(result, story.source_locale,
+                    story.target_locale), kind="translation")
+            studiable.raw_text = result + result_trans
+            pairs = zip(result.splitlines(), result_trans.splitlines())
+        events.publish(story.id, "chapter_text_ready", studiable_id=studiable.id)
         
         # Parse sentences and generate audio
         sentences = []
-        for order, (src, tgt) in enumerate(zip(result.splitlines(), result_trans.splitlines())):
+        batch = {story.source_locale: ([], []), story.target_locale: ([], [])}
+        for order, (src, tgt) in enumerate(pairs):
             src = src.strip()
             tgt = tgt.strip()
             if not src or not tgt:
                 continue
             
-            # Save audio files
-            src_uri = get_audio_fname(story.source_locale, src)
-            tgt_uri = get_audio_fname(story.target_locale, tgt)
-            
-            src_write_path = get_audio_write_fname(story.source_locale, src)
-            tgt_write_path = get_audio_write_fname(story.target_locale, tgt)
-            
-            # Generate TTS audio
-            fut_src = submit_tts_task(story.source_locale, src, src_write_path)
-            fut_tgt = submit_tts_task(story.target_locale, tgt, tgt_write_path)
-            # src_bytes = synthesize_tts(story.source_locale, src)
-            # tgt_bytes = synthesize_tts(story.target_locale, tgt)
-            
-            
-            
-            # Create sentence pair
-            sid = next(sentence_counter)
-            sp = SentencePair(
-                id=sid,
-                source_text=src,
-                target_text=tgt,
-                source_audio=src_uri,
-                target_audio=tgt_uri,
-                order=order
-            )
-            db["sentences"][sid] = sp
-            sentences.append(sp)
+            sentences.append(_create_sentence_pair(
+                studiable, story, order, src, tgt, batch if TTS_MODE == "batched" else None
+            ))
+        
+        for locale, (texts, paths) in batch.items():
+            if texts:
+                _pending_audio[studiable.id].append(
+                    submit_tts_batch_task(locale, texts, paths, story.id, studiable.id)
+                )
         
         studiable.sentences = sentences
+        index.set_sentences(studiable)
         
     except Exception as e:
         print(f"Error processing chapter: {e}")
+        errors.inc(stage="chapter")
         studiable.metadata["error"] = str(e)
+    
+    finally:
+        # Persist the finished chapter (text + all sentence pairs) in one batch
+        storage.save_studiable(studiable)
+        _publish_finished(studiable)
+        if studiable.metadata.get("error"):
+            _pending_audio.pop(studiable.id, None)
+        else:
+            submit_bundle_task(studiable)
+
+
+def _publish_finished(studiable: Studiable):
+    """Tell subscribers that a studiable finished processing, or why it failed."""
+    index.touch_studiable(studiable)
+    error = studiable.metadata.get("error")
+    if error:
+        events.publish(studiable.story_id, "error", stage="generation",
+                       studiable_id=studiable.id, error=error)
+    else:
+        events.publish(studiable.story_id, "studiable_ready", studiable_id=studiable.id,
+                       sentence_count=len(studiable.sentence_ids))
+
+
+def generate_sentence_pairs(prompt: str, story: Story) -> List[tuple]:
+    """Generate a chapter and its translation as aligned pairs in one Gemini call."""
+    fused_prompt = prompt + build_aligned_output_instructions(
+        story.source_locale, story.target_locale
+    )
+    # Story text is creative, so never served from cache
+    response = generate_structured(fused_prompt, SENTENCE_PAIRS_SCHEMA, cache=False,
+                                   kind="story")
+    return parse_sentence_pairs(response)
+
+
+def _create_sentence_pair(
+    studiable: Studiable,
+    story: Story,
+    order: int,
+    src: str,
+    tgt: str,
+    batch: Optional[dict] = None
+) -> SentencePair:
+    """Register a sentence pair and queue its audio (into `batch` when batching TTS)."""
+    # Save audio files
+    src_uri = get_audio_fname(story.source_locale, src)
+    tgt_uri = get_audio_fname(story.target_locale, tgt)
+    
+    src_write_path = get_audio_write_fname(story.source_locale, src)
+    tgt_write_path = get_audio_write_fname(story.target_locale, tgt)
+    
+    # Generate TTS audio
+    if batch is not None:
+        batch[story.source_locale][0].append(src)
+        batch[story.source_locale][1].append(src_write_path)
+        batch[story.target_locale][0].append(tgt)
+        batch[story.target_locale][1].append(tgt_write_path)
+    else:
+        _pending_audio[studiable.id].extend([
+            submit_tts_task(story.source_locale, src, src_write_path, story.id, studiable.id),
+            submit_tts_task(story.target_locale, tgt, tgt_write_path, story.id, studiable.id),
+        ])
+    
+    # Create sentence pair
+    sid = next_id("sentences")
+    sp = SentencePair(
+        id=sid,
+        source_text=src,
+        target_text=tgt,
+        source_audio=src_uri,
+        target_audio=tgt_uri,
+        order=order
+    )
+    db["sentences"][sid] = sp
+    events.publish(story.id, "sentence_created", studiable_id=studiable.id, sentence=sp.to_dict())
+    return sp
+
+
+def process_chapter_streaming(studiable: Studiable, story: Story, prompt: str):
+    """
+    Streaming chapter pipeline.
+    
+    Each sentence is sent for translation as soon as Gemini finishes writing
+    it, and sentence pairs are published to the studiable in order as their
+    translations arrive, so learners can start on the first cards early.
+    """
+    source_lines, target_lines = [], []
+    pending = deque()  # (order, source sentence, translation future)
+    
+    def flush(block: bool):
+        while pending and (block or pending[0][2].done()):
+            order, src, fut = pending.popleft()
+            tgt = " ".join(line.strip() for line in fut.result().splitlines() if line.strip())
+            if not tgt:
+                continue
+            sp = _create_sentence_pair(studiable, story, order, src, tgt)
+            source_lines.append(src)
+            target_lines.append(tgt)
+            studiable.sentence_ids.append(sp.id)
+            index.add_sentence(studiable, sp.id)
+    
+    with ThreadPoolExecutor(max_workers=STREAM_TRANSLATION_WORKERS) as pool:
+        # Story text is creative, so never served from cache
+        for line in generate_text_stream(prompt, kind="story"):
+            src = line.strip()
+            if not src:
+                continue
+            translation_prompt = build_translation_prompt(
+                src, story.source_locale, story.target_locale
+            )
+            pending.append((len(source_lines) + len(pending), src,
+                            pool.submit(generate_text, translation_prompt, kind="translation")))
+            flush(block=False)
+        flush(block=True)
+    
+    studiable.raw_text = "\n".join(source_lines) + "\n".join(target_lines)
+    events.publish(story.id, "chapter_text_ready", studiable_id=studiable.id)
 
 
 def process_quiz(
@@ -461,50 +1303,65 @@ def process_quiz(
         )
         
         # Generate quiz questions
-        result = generate_text(prompt)
+        result = generate_text(prompt, kind="quiz")
         studiable.raw_text = result
         
-        # Parse questions and generate audio (alternating lines: question, answer, question, answer)
-        sentences = []
+        # Parse questions (alternating lines: question, answer, question, answer)
         lines = [line.strip() for line in result.splitlines() if line.strip()]
+        qa_pairs = [
+            (i // 2, lines[i], lines[i + 1])
+            for i in range(0, len(lines) - 1, 2)  # Skip an incomplete trailing pair
+        ]
         
-        # Process pairs of lines (question on even index, answer on odd index)
-        for i in range(0, len(lines), 2):
-            if i + 1 >= len(lines):
-                break  # Skip if we don't have a complete pair
-            
-            question = lines[i]
-            answer = lines[i + 1]
-            
-            if not question or not answer:
-                continue
-            
-            # Generate TTS audio (both in target language)
-            question_bytes = synthesize_tts(story.target_locale, question)
-            answer_bytes = synthesize_tts(story.target_locale, answer)
-            
-            # Save audio files
-            question_path = save_audio_bytes(story.target_locale, question, question_bytes)
-            answer_path = save_audio_bytes(story.target_locale, answer, answer_bytes)
-            
+        # Generate TTS audio for every question and answer concurrently (both in
+        # target language), sharing the global TTS budget with chapters
+        locale = story.target_locale
+        items = []
+        for _, question, answer in qa_pairs:
+            items.append((locale, question, get_audio_write_fname(locale, question)))
+            items.append((locale, answer, get_audio_write_fname(locale, answer)))
+        results = run_tts_tasks(items, story.id, studiable.id)
+        
+        # Failed items keep their URL: the retry queue writes the file later
+        audio_urls = {}
+        audio_errors = []
+        for (_, text, _), res in zip(items, results):
+            if isinstance(res, BaseException):
+                audio_errors.append({"text": text, "error": str(res)})
+            audio_urls[text] = get_audio_fname(locale, text)
+        if audio_errors:
+            print(f"[TTS] {len(audio_errors)} quiz audio items failed")
+            studiable.metadata["audio_errors"] = audio_errors
+        
+        sentences = []
+        for order, question, answer in qa_pairs:
             # Create sentence pair (question as target, answer as source for consistency)
-            sid = next(sentence_counter)
+            sid = next_id("sentences")
             sp = SentencePair(
                 id=sid,
                 source_text=answer,  # Answer shown on back
                 target_text=question,  # Question shown on front
-                source_audio=answer_path,
-                target_audio=question_path,
-                order=i // 2  # Use pair index as order
+                source_audio=audio_urls[answer],
+                target_audio=audio_urls[question],
+                order=order  # Use pair index as order
             )
             db["sentences"][sid] = sp
             sentences.append(sp)
+            events.publish(story.id, "sentence_created", studiable_id=studiable.id,
+                           sentence=sp.to_dict())
         
         studiable.sentences = sentences
+        index.set_sentences(studiable)
         
     except Exception as e:
         print(f"Error processing quiz: {e}")
+        errors.inc(stage="quiz")
         studiable.metadata["error"] = str(e)
+    
+    storage.save_studiable(studiable)
+    _publish_finished(studiable)
+    if not studiable.metadata.get("error"):
+        submit_bundle_task(studiable)
 
 
 
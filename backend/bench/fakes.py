@@ -0,0 +1,153 @@
+"""
+Deterministic stand-ins for the Gemini and Google TTS calls.
+
+`install()` swaps them in for the real client functions so the API can be
+exercised offline. Each fake sleeps for a configurable latency (plus
+uniform jitter) and fails at a configurable rate, driven by a seeded RNG so
+runs with the same settings are comparable.
+"""
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from dataclasses import dataclass
+
+from src.audio import _ogg_page
+
+# One MPEG-1 layer III frame (128 kbps, 44.1 kHz, ~26 ms) of silence, so fake
+# audio can be measured and split like the real thing
+_MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+# Ogg Opus headers (mono, 16 kHz input) and one 20 ms CELT packet
+_OPUS_HEAD = b"OpusHead" + bytes([1, 1]) + struct.pack("<HI", 312, 16000) + b"\x00\x00\x00"
+_OPUS_TAGS = b"OpusTags" + struct.pack("<II", 0, 0)
+_OPUS_PACKET = bytes([31 << 3]) + b"\x00" * 40
+
+
+@dataclass
+class CallProfile:
+    latency: float = 0.0  # seconds
+    jitter: float = 0.0  # seconds, uniform in [-jitter, +jitter]
+    error_rate: float = 0.0  # 0..1
+
+
+class FakeError(Exception):
+    """Injected failure of a fake external call, reported like a 503 from the service."""
+
+    code = 503
+
+
+class _Caller:
+    def __init__(self, name: str, profile: CallProfile, seed: int):
+        self.name = name
+        self.profile = profile
+        self.calls = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.profile.latency + self._rng.uniform(-self.profile.jitter,
+                                                             self.profile.jitter)
+            fail = self._rng.random() < self.profile.error_rate
+            if fail:
+                self.failures += 1
+        time.sleep(max(0.0, delay))
+        if fail:
+            raise FakeError(f"injected {self.name} failure")
+
+
+def _tag(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode()).hexdigest()[:6]
+
+
+def _section(prompt: str, header: str) -> list:
+    """Lines of a prompt section, up to the next blank line."""
+    _, _, rest = prompt.partition(header + "\n")
+    return [line for line in rest.split("\n\n", 1)[0].splitlines() if line.strip()]
+
+
+def story_lines(prompt: str, count: int = 10) -> list:
+    tag = _tag(prompt)
+    return [f"Sentence {i + 1} of chapter {tag}." for i in range(count)]
+
+
+def fake_text(prompt: str, kind: str) -> str:
+    if kind == "title":
+        return f"Bench story {_tag(prompt)}"
+    if kind == "translation":
+        return "\n".join(f"ES {line}" for line in _section(prompt, "INPUT STORY:"))
+    if kind == "quiz":
+        return "\n".join(
+            line for i in range(5) for line in (f"Question {i + 1} {_tag(prompt)} <BLANK>?",
+                                                f"answer {i + 1}")
+        )
+    if kind == "summary":
+        return f"Summary {_tag(prompt)}: the story so far."
+    return "\n".join(story_lines(prompt))
+
+
+def fake_mp3(text: str) -> bytes:
+    return _MP3_FRAME * max(1, len(text) // 4)
+
+
+def fake_opus(text: str) -> bytes:
+    """Ogg Opus stream about as long as `fake_mp3(text)`."""
+    packets = [_OPUS_PACKET] * max(1, len(text) * 26 // 80)
+    pages = [_ogg_page(1, 0, 0, 0x02, [_OPUS_HEAD]), _ogg_page(1, 1, 0, 0, [_OPUS_TAGS])]
+    for start in range(0, len(packets), 100):
+        last = start + 100 >= len(packets)
+        pages.append(_ogg_page(1, len(pages), 960 * min(start + 100, len(packets)),
+                               0x04 if last else 0, packets[start:start + 100]))
+    return b"".join(pages)
+
+
+def fake_audio(text: str, profile: str = "mp3") -> bytes:
+    return fake_opus(text) if profile == "opus" else fake_mp3(text)
+
+
+class Fakes:
+    def __init__(self, llm: CallProfile, tts: CallProfile, seed: int = 0):
+        self.llm = _Caller("llm", llm, seed)
+        self.tts = _Caller("tts", tts, seed + 1)
+
+    def generate_text(self, prompt: str, cache: bool = True, kind: str = "other") -> str:
+        self.llm()
+        return fake_text(prompt, kind)
+
+    def generate_structured(self, prompt: str, response_schema: dict, cache: bool = True,
+                            kind: str = "other") -> str:
+        self.llm()
+        return json.dumps([
+            {"source": line, "target": f"ES {line}"} for line in story_lines(prompt)
+        ])
+
+    def generate_text_stream(self, prompt: str, kind: str = "other"):
+        lines = fake_text(prompt, kind).splitlines()
+        self.llm()
+        yield from lines
+
+    def synthesize_tts(self, locale: str, text: str, profile: str = "mp3") -> bytes:
+        self.tts()
+        return fake_audio(text, profile)
+
+    def synthesize_tts_batch(self, locale: str, texts: list, profile: str = "mp3") -> list:
+        self.tts()
+        return [fake_audio(text, profile) for text in texts]
+
+    def stats(self) -> dict:
+        return {
+            name: {"calls": caller.calls, "failures": caller.failures}
+            for name, caller in (("llm", self.llm), ("tts", self.tts))
+        }
+
+    def install(self, api_main, gemini_client):
+        """Patch the fakes into the Gemini client module and the API's imported names."""
+        for name in ("generate_text", "generate_structured", "generate_text_stream"):
+            setattr(gemini_client, name, getattr(self, name))
+            setattr(api_main, name, getattr(self, name))
+        gemini_client.synthesize_tts = self.synthesize_tts
+        gemini_client.synthesize_tts_batch = self.synthesize_tts_batch
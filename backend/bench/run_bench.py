@@ -0,0 +1,286 @@
+"""
+Offline end-to-end benchmark for the story generation pipeline.
+
+Runs the API in-process with the Gemini and TTS calls replaced by the
+latency/jitter/error-rate stand-ins in `bench/fakes.py`. It drives N stories
+concurrently through the HTTP endpoints: create a story, add chapters, add a
+quiz for the last chapter, and poll each one until it is done. Results are
+written as JSON so runs can be compared.
+
+Usage (from the backend directory; needs httpx for FastAPI's TestClient):
+
+    python bench/run_bench.py --stories 8 --chapters 3 --llm-latency 1.5 --tts-latency 0.3
+
+Pipeline settings come from the usual environment variables
+(APRENDIA_TTS_MODE, APRENDIA_GENERATION_MODE, APRENDIA_JOB_WORKERS, ...).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.fakes import CallProfile, Fakes  # noqa: E402
+
+STORY_PARAMS = {
+    "source_locale": "en_us",
+    "target_locale": "es_co",
+    "language_level": "A1",
+    "age_level": "toddler",
+    "topic": "a day at the market",
+    "conversation_type": "dialogue",
+    "min_sentence_length": 3,
+    "max_sentence_length": 8,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stories", type=int, default=4, help="concurrent stories")
+    parser.add_argument("--chapters", type=int, default=2, help="chapters per story")
+    parser.add_argument("--no-quiz", action="store_true", help="skip the quiz per story")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.2)
+    parser.add_argument("--tts-jitter", type=float, default=0.05)
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120.0,
+                        help="seconds to wait for any one studiable")
+    parser.add_argument("--out", help="result file (default: bench/results/<timestamp>.json)")
+    return parser.parse_args(argv)
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": rank(50),
+        "p90": rank(90),
+        "p99": rank(99),
+        "max": ordered[-1],
+    }
+
+
+class Bench:
+    def __init__(self, client, api_main, args):
+        self.client = client
+        self.api_main = api_main
+        self.args = args
+        self.timings = {}  # endpoint -> [seconds]
+        self.chapter_text = []
+        self.chapter_audio = []
+        self.quiz_times = []
+        self.failed = {"chapter": 0, "quiz": 0}
+        self.missing_audio = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, seconds: float):
+        with self._lock:
+            self.timings.setdefault(name, []).append(seconds)
+
+    def call(self, name: str, method: str, url: str, **kwargs):
+        while True:
+            start = time.perf_counter()
+            response = self.client.request(method, url, **kwargs)
+            self._record(name, time.perf_counter() - start)
+            if response.status_code != 503:
+                response.raise_for_status()
+                return response.json()
+            # Job queue full: back off and retry like a client would
+            with self._lock:
+                self.rejected += 1
+            time.sleep(0.5)
+
+    def _background_busy(self) -> bool:
+        return sum(value for _, _, value in self.api_main.background_tasks.samples()) > 0
+
+    def wait_done(self, studiable_id: int, job_id: int, start: float):
+        """Poll until the generation job finishes; returns (studiable, text_seconds)."""
+        deadline = start + self.args.timeout
+        while time.perf_counter() < deadline:
+            job = self.call("get_job", "GET", f"/jobs/{job_id}")
+            if job["status"] in ("done", "failed"):
+                break
+            self.call("get_studiable", "GET", f"/studiables/{studiable_id}")
+            time.sleep(self.args.poll_interval)
+        studiable = self.call("get_studiable", "GET", f"/studiables/{studiable_id}")
+        return studiable, time.perf_counter() - start
+
+    def wait_audio(self, studiable: dict, start: float) -> float:
+        """Poll until every sentence's audio is served, or no TTS work is left."""
+        urls = {
+            url for sp in studiable["sentences"]
+            for url in (sp["source_audio"], sp["target_audio"]) if url
+        }
+        deadline = start + self.args.timeout
+        while urls and time.perf_counter() < deadline:
+            # Read before checking files, so an idle loop means nothing more will appear
+            busy = self._background_busy()
+            urls = {url for url in urls if self.client.head(url).status_code != 200}
+            if not urls or not busy:
+                break
+            time.sleep(self.args.poll_interval)
+        with self._lock:
+            self.missing_audio += len(urls)
+        return time.perf_counter() - start
+
+    def _finish_chapter(self, studiable_id: int, job_id: int, start: float):
+        studiable, text_seconds = self.wait_done(studiable_id, job_id, start)
+        if studiable["metadata"].get("error") or not studiable["sentences"]:
+            with self._lock:
+                self.failed["chapter"] += 1
+            return None
+        audio_seconds = self.wait_audio(studiable, start)
+        with self._lock:
+            self.chapter_text.append(text_seconds)
+            self.chapter_audio.append(audio_seconds)
+        return studiable
+
+    def run_story(self, n: int):
+        start = time.perf_counter()
+        created = self.call("create_story", "POST", "/stories",
+                            json={**STORY_PARAMS, "title": f"Bench story {n}"})
+        story_id = created["story"]["id"]
+        chapter = self._finish_chapter(created["chapter_id"], created["job_id"], start)
+
+        for _ in range(self.args.chapters - 1):
+            start = time.perf_counter()
+            created = self.call("create_studiable", "POST", f"/stories/{story_id}/studiables",
+                                json={"type": "chapter", **STORY_PARAMS})
+            chapter = self._finish_chapter(created["studiable_id"], created["job_id"], start) \
+                or chapter
+
+        if chapter and not self.args.no_quiz:
+            start = time.perf_counter()
+            created = self.call("create_studiable", "POST", f"/stories/{story_id}/studiables",
+                                json={"type": "quiz", "parent_studiable_id": chapter["id"]})
+            quiz, seconds = self.wait_done(created["studiable_id"], created["job_id"], start)
+            with self._lock:
+                if quiz["metadata"].get("error"):
+                    self.failed["quiz"] += 1
+                else:
+                    self.quiz_times.append(seconds)
+
+    def run(self) -> float:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.stories) as pool:
+            for future in [pool.submit(self.run_story, n) for n in range(self.args.stories)]:
+                future.result()
+        return time.perf_counter() - start
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Keep the run's database, caches and audio out of the working tree
+    workdir = tempfile.mkdtemp(prefix="aprendia-bench-")
+    os.environ["APRENDIA_DB_PATH"] = os.path.join(workdir, "aprendia.db")
+    os.environ["APRENDIA_LLM_CACHE_PATH"] = os.path.join(workdir, "llm_cache.db")
+    os.environ.pop("APRENDIA_JOBS_PATH", None)
+    os.chdir(workdir)
+
+    import api_main
+    from fastapi.testclient import TestClient
+    from src import gemini_client
+    from src.jobs import JOB_WORKERS
+    from src.tts import tts_cache_stats
+    from src.tts_limiter import TTS_CONCURRENCY, tts_limiter
+
+    fakes = Fakes(
+        CallProfile(args.llm_latency, args.llm_jitter, args.llm_error_rate),
+        CallProfile(args.tts_latency, args.tts_jitter, args.tts_error_rate),
+        seed=args.seed,
+    )
+    fakes.install(api_main, gemini_client)
+
+    with TestClient(api_main.app) as client:
+        bench = Bench(client, api_main, args)
+        wall = bench.run()
+        llm_cache_stats = dict(gemini_client.get_llm_cache().stats)
+
+    chapters = len(bench.chapter_text)
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "config": {
+            **vars(args),
+            "tts_concurrency": TTS_CONCURRENCY,
+            "tts_mode": api_main.TTS_MODE,
+            "generation_mode": api_main.GENERATION_MODE,
+            "job_workers": JOB_WORKERS,
+        },
+        "wall_seconds": wall,
+        "throughput": {
+            "chapters_per_second": chapters / wall if wall else 0.0,
+            "stories_per_minute": args.stories * 60 / wall if wall else 0.0,
+        },
+        "chapter_text_seconds": percentiles(bench.chapter_text),
+        "chapter_audio_seconds": percentiles(bench.chapter_audio),
+        "quiz_seconds": percentiles(bench.quiz_times),
+        "endpoint_seconds": {name: percentiles(v) for name, v in sorted(bench.timings.items())},
+        "failed": bench.failed,
+        "missing_audio": bench.missing_audio,
+        "rejected_503": bench.rejected,
+        "fake_calls": fakes.stats(),
+        "caches": {"tts": dict(tts_cache_stats), "llm": llm_cache_stats},
+        "tts_limit": {
+            "final": int(tts_limiter.limiter.limit),
+            "retry_queue": len(tts_limiter.retry_queue),
+        },
+    }
+
+    out = args.out or os.path.join(
+        BACKEND_DIR, "bench", "results",
+        f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{chapters} chapters in {wall:.2f}s "
+          f"({result['throughput']['chapters_per_second']:.2f} chapters/s)")
+    for label in ("chapter_text_seconds", "chapter_audio_seconds", "quiz_seconds"):
+        p = result[label]
+        if p["count"]:
+            print(f"  {label:24} p50 {p['p50']:.3f}s  p99 {p['p99']:.3f}s")
+    for name, p in result["endpoint_seconds"].items():
+        print(f"  {name:24} p50 {p['p50'] * 1000:.1f}ms  p99 {p['p99'] * 1000:.1f}ms  (n={p['count']})")
+    print(f"Results written to {out}")
+    if result["tts_limit"]["retry_queue"]:
+        # Audio still waiting for a retry is missing, whatever the polls saw
+        raise SystemExit(f"{result['tts_limit']['retry_queue']} TTS items were left in the retry queue")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Minimal MP3 (MPEG audio layer III) frame parsing and Ogg Opus packet parsing.
+
+Google TTS returns constant-bitrate MP3 without a container, so audio can be
+split at frame boundaries without decoding or re-encoding.
+Ogg Opus is split the same way at packet boundaries, with the packets of
+each slice wrapped in fresh Ogg pages behind copies of the stream headers.
+"""
+import struct
+from bisect import bisect_right
+from typing import Iterator, List, Tuple
+
+_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG1
+    2: [22050, 24000, 16000],  # MPEG2
+    0: [11025, 12000, 8000],  # MPEG2.5
+}
+
+
+def _skip_id3(audio: bytes) -> int:
+    """Return the offset of the first byte after a leading ID3v2 tag, if any."""
+    if len(audio) >= 10 and audio[:3] == b"ID3":
+        size = (audio[6] << 21) | (audio[7] << 14) | (audio[8] << 7) | audio[9]
+        footer = 10 if audio[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def _parse_header(audio: bytes, pos: int):
+    """Return (frame_length, duration_seconds) for a layer III header at `pos`, or None."""
+    if pos + 4 > len(audio):
+        return None
+    b1, b2 = audio[pos + 1], audio[pos + 2]
+    if audio[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    samples = 1152 if mpeg1 else 576
+    length = (samples // 8) * bitrate // sample_rate + padding
+    return length, samples / sample_rate
+
+
+def mp3_frames(audio: bytes) -> Iterator[Tuple[int, int, float]]:
+    """Yield (offset, length, duration_seconds) for each MP3 frame in `audio`."""
+    pos = _skip_id3(audio)
+    while pos < len(audio):
+        header = _parse_header(audio, pos)
+        if header is None:
+            # Resynchronise on the next frame header
+            pos += 1
+            continue
+        length, duration = header
+        if length <= 0:
+            pos += 1
+            continue
+        yield pos, length, duration
+        pos += length
+
+
+def split_mp3(audio: bytes, cut_times: List[float]) -> List[bytes]:
+    """
+    Split an MP3 stream at the given times (seconds, ascending).
+
+    Cuts snap to the nearest frame boundary. Returns len(cut_times) + 1 slices.
+    """
+    segments = [bytearray() for _ in range(len(cut_times) + 1)]
+    t = 0.0
+    for offset, length, duration in mp3_frames(audio):
+        segment = bisect_right(cut_times, t + duration / 2)
+        segments[segment] += audio[offset:offset + length]
+        t += duration
+    return [bytes(s) for s in segments]
+
+
+# Ogg pages use CRC-32 with polynomial 0x04C11DB7, unreflected, no final XOR
+_OGG_CRC = []
+for _i in range(256):
+    _r = _i << 24
+    for _ in range(8):
+        _r = ((_r << 1) ^ 0x04C11DB7) if _r & 0x80000000 else _r << 1
+    _OGG_CRC.append(_r & 0xFFFFFFFF)
+_OGG_PAGE = struct.Struct("<4sBBqIIIB")
+_OPUS_RATE = 48000  # Opus granule positions always count 48 kHz samples
+
+
+def _ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC[(crc >> 24) ^ byte]
+    return crc
+
+
+def _ogg_packets(audio: bytes) -> Tuple[int, List[bytes]]:
+    """Return (serial number, packets) of a single logical Ogg stream."""
+    packets, current, pos, serial = [], bytearray(), 0, None
+    while pos < len(audio):
+        if audio[pos:pos + 4] != b"OggS" or pos + _OGG_PAGE.size > len(audio):
+            raise ValueError(f"Not an Ogg page at byte {pos}")
+        _, _, _, _, page_serial, _, _, count = _OGG_PAGE.unpack_from(audio, pos)
+        serial = page_serial if serial is None else serial
+        lacing = audio[pos + _OGG_PAGE.size:pos + _OGG_PAGE.size + count]
+        pos += _OGG_PAGE.size + count
+        for value in lacing:
+            current += audio[pos:pos + value]
+            pos += value
+            if value < 255:
+                packets.append(bytes(current))
+                current = bytearray()
+    if serial is None:
+        raise ValueError("Empty Ogg stream")
+    return serial, packets
+
+
+def _ogg_page(serial: int, sequence: int, granule: int, flags: int, packets: List[bytes]) -> bytes:
+    lacing = bytearray()
+    for packet in packets:
+        lacing += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+    if len(lacing) > 255:
+        raise ValueError("Ogg packet too large for one page")
+    header = _OGG_PAGE.pack(b"OggS", 0, flags, granule, serial, sequence, 0, len(lacing))
+    page = bytearray(header + lacing + b"".join(packets))
+    struct.pack_into("<I", page, 22, _ogg_crc(page))
+    return bytes(page)
+
+
+def _opus_packet_samples(packet: bytes) -> int:
+    """Samples (at 48 kHz) in one Opus packet, from its TOC byte (RFC 6716 3.1)."""
+    if not packet:
+        return 0
+    config = packet[0] >> 3
+    if config < 12:
+        frame = (480, 960, 1920, 2880)[config % 4]  # SILK 10-60 ms
+    elif config < 16:
+        frame = (480, 960)[config % 2]  # hybrid 10-20 ms
+    else:
+        frame = (120, 240, 480, 960)[config % 4]  # CELT 2.5-20 ms
+    code = packet[0] & 0x03
+    if code == 0:
+        return frame
+    if code in (1, 2):
+        return 2 * frame
+    return frame * (packet[1] & 0x3F) if len(packet) > 1 else 0
+
+
+def split_ogg_opus(audio: bytes, cut_times: List[float]) -> List[bytes]:
+    """
+    Split an Ogg Opus stream at the given times (seconds, ascending).
+
+    Cuts snap to the nearest packet boundary. Returns len(cut_times) + 1
+    streams, each with the original OpusHead and OpusTags headers.
+    """
+    serial, packets = _ogg_packets(audio)
+    if len(packets) < 2 or not packets[0].startswith(b"OpusHead") or len(packets[0]) < 19:
+        raise ValueError("Not an Ogg Opus stream")
+    head, tags, audio_packets = packets[0], packets[1], packets[2:]
+    pre_skip = struct.unpack_from("<H", head, 10)[0]
+
+    slices = [[] for _ in range(len(cut_times) + 1)]
+    position = 0
+    for packet in audio_packets:
+        samples = _opus_packet_samples(packet)
+        t = (position - pre_skip + samples / 2) / _OPUS_RATE
+        slices[bisect_right(cut_times, t)].append((packet, samples))
+        position += samples
+
+    streams = []
+    for slice_packets in slices:
+        pages = [_ogg_page(serial, 0, 0, 0x02, [head]), _ogg_page(serial, 1, 0, 0, [tags])]
+        granule, batch, lacing = 0, [], 0
+        for packet, samples in slice_packets:
+            size = len(packet) // 255 + 1
+            if batch and lacing + size > 255:
+                pages.append(_ogg_page(serial, len(pages), granule, 0, batch))
+                batch, lacing = [], 0
+            batch.append(packet)
+            lacing += size
+            granule += samples
+        pages.append(_ogg_page(serial, len(pages), granule, 0x04, batch))
+        streams.append(b"".join(pages))
+    return streams
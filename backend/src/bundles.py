@@ -0,0 +1,74 @@
+"""
+Packed per-studiable audio bundles.
+
+Each side of a finished chapter or quiz (source or target audio) is packed
+into one MP3 file by concatenating the sentences' MP3 frames, together with
+an index of where each sentence sits in it (byte offset/length and start
+time/duration). A client can then fetch one file and seek to each sentence
+instead of making a request per card.
+
+Bundles are content-addressed like sentence audio: the name is a hash of the
+member file names, so they are served with the same immutable caching.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from src.audio import mp3_frames
+from src.models import Studiable
+from src.tts import ensure_audio_path, find_audio_url, text_hash_filename, write_audio_atomic
+
+
+def build_bundle(items: List[Tuple[int, str]]) -> Optional[Dict]:
+    """
+    Pack the audio behind `items` ((sentence_id, audio URL), in order) into a bundle.
+
+    Sentences whose audio is missing (or not MP3) are left out, so the client
+    falls back to their own URLs. Returns None when there is no audio at all.
+    """
+    parts = []
+    for sentence_id, url in items:
+        fpath = find_audio_url(url) if url else None
+        if fpath is None:
+            continue
+        audio = fpath.read_bytes()
+        frames = list(mp3_frames(audio))
+        if frames:
+            parts.append((sentence_id, url, audio, frames))
+    if not parts:
+        return None
+
+    locale = parts[0][1].split("/")[2]
+    fname = text_hash_filename(locale, "bundle\n" + "\n".join(url for _, url, _, _ in parts))
+
+    packed = bytearray()
+    segments = []
+    t = 0.0
+    for sentence_id, _, audio, frames in parts:
+        offset = len(packed)
+        duration = 0.0
+        for frame_offset, length, frame_duration in frames:
+            packed += audio[frame_offset:frame_offset + length]
+            duration += frame_duration
+        segments.append({
+            "sentence_id": sentence_id,
+            "offset": offset,
+            "length": len(packed) - offset,
+            "start": round(t, 3),
+            "duration": round(duration, 3),
+        })
+        t += duration
+
+    fpath = ensure_audio_path(locale, fname) / fname
+    if not fpath.exists():
+        write_audio_atomic(fpath, bytes(packed))
+    return {"url": f"/audio/{locale}/{fname}", "duration": round(t, 3), "segments": segments}
+
+
+def build_studiable_bundles(studiable: Studiable) -> Dict:
+    """Bundles for the source and target audio of a studiable, keyed by side."""
+    sentences = sorted(studiable.sentences, key=lambda sp: sp.order)
+    bundles = {}
+    for side in ("source", "target"):
+        bundle = build_bundle([(sp.id, getattr(sp, f"{side}_audio")) for sp in sentences])
+        if bundle:
+            bundles[side] = bundle
+    return bundles
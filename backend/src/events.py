@@ -0,0 +1,64 @@
+"""
+In-process publish/subscribe for story progress events.
+
+Generation runs on worker threads and the background TTS loop, while
+subscribers are server-sent-event streams running on the API event loop.
+`publish` is thread-safe and hands each event to every subscriber's queue on
+that subscriber's own loop.
+"""
+import asyncio
+import itertools
+import threading
+from typing import Dict, List, Tuple
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def subscribe(self, story_id: int) -> asyncio.Queue:
+        """Register a queue for events of `story_id`; call from the subscriber's event loop."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(story_id, []).append(entry)
+        return queue
+
+    def unsubscribe(self, story_id: int, queue: asyncio.Queue):
+        with self._lock:
+            entries = self._subscribers.get(story_id, [])
+            self._subscribers[story_id] = [e for e in entries if e[1] is not queue]
+            if not self._subscribers[story_id]:
+                del self._subscribers[story_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._subscribers.values())
+
+    def publish(self, story_id: int, event_type: str, **data):
+        """Send an event to all subscribers of `story_id`. Safe to call from any thread."""
+        with self._lock:
+            entries = list(self._subscribers.get(story_id, []))
+        if not entries:
+            return
+        event = {"id": next(self._seq), "type": event_type, "story_id": story_id, **data}
+        for loop, queue in entries:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Subscriber's loop has already closed
+                pass
+
+
+def _offer(queue: asyncio.Queue, event: Dict):
+    """Enqueue without blocking; a slow subscriber loses its oldest events first."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+events = EventBus()
@@ -1,34 +1,24 @@
-import os
-from google.cloud import texttospeech
+"""
+Gemini text generation and Google TTS.
 
+Nothing here talks to Google at import time: credentials, authentication,
+Vertex AI and the SDK clients are set up on first use (see `init_google`),
+so the API can start serving, e.g. /health, without network access.
+"""
+import os
 import json
 import tempfile
-
-def setup_google_credentials():
-    creds_json = os.getenv("GCP_CREDENTIALS_JSON")
-    if creds_json:
-        data = json.loads(creds_json)
-        # Write to a temp file
-        with tempfile.NamedTemporaryFile(mode="w", delete=False) as f:
-            json.dump(data, f)
-            f.flush()
-            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = f.name
-        print(f"✅ Loaded Google credentials from env into {f.name}")
-    else:
-        print("⚠️ GCP_CREDENTIALS_JSON not found. Using default creds (will fail outside GCP).")
-
-setup_google_credentials()
-
-import google.auth
-creds, project = google.auth.default()
-print(f"✅ Authenticated as {creds.service_account_email}, project={project}")
-
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel 
 import asyncio
-import aiofiles
 import logging
-import json
+import threading
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+from src.audio import split_mp3, split_ogg_opus
+from src import llm_calls
+from src.llm_cache import get_llm_cache
+from src.metrics import llm_latency, tts_latency, observe_call
+from src.tts import async_cached_audio, async_cached_audio_batch, get_audio_write_fname
+from src.tts import AUDIO_PROFILES, CANONICAL_PROFILE, profiles_for
 
 # from google.oauth2 import service_account
 PROJECT = os.getenv("GCP_PROJECT")
@@ -46,37 +36,382 @@ PROJECT = os.getenv("GCP_PROJECT")
 #     credentials = service_account.Credentials.from_service_account_file(cred_file)
 # PROJECT = os.getenv("GCP_PROJECT")
 REGION = os.getenv("GCP_REGION", "us-central1")
-vertexai.init(project=PROJECT, location=REGION)#, credentials=credentials)
 
 
+def setup_google_credentials():
+    creds_json = os.getenv("GCP_CREDENTIALS_JSON")
+    if creds_json:
+        data = json.loads(creds_json)
+        # Write to a temp file
+        with tempfile.NamedTemporaryFile(mode="w", delete=False) as f:
+            json.dump(data, f)
+            f.flush()
+            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = f.name
+        print(f"✅ Loaded Google credentials from env into {f.name}")
+    else:
+        print("⚠️ GCP_CREDENTIALS_JSON not found. Using default creds (will fail outside GCP).")
+
+
+_google_ready = False
+_google_lock = threading.Lock()
+
+
+def init_google():
+    """
+    Load credentials, authenticate and initialise Vertex AI, once per process.
+
+    Called before the first client is created; safe to call from any thread.
+    A failed attempt is retried on the next call.
+    """
+    global _google_ready
+    if _google_ready:
+        return
+    with _google_lock:
+        if _google_ready:
+            return
+        setup_google_credentials()
+
+        import google.auth
+        creds, project = google.auth.default()
+        print(f"✅ Authenticated as {creds.service_account_email}, project={project}")
+
+        import vertexai
+        vertexai.init(project=PROJECT, location=REGION)#, credentials=credentials)
+        _google_ready = True
+
+
+def _gemini_model():
+    init_google()
+    from vertexai.preview.generative_models import GenerativeModel
+    return GenerativeModel(MODEL_NAME)
+
+
+def _tts_client():
+    init_google()
+    from google.cloud import texttospeech
+    return texttospeech.TextToSpeechClient()
+
+
+def _tts_beta_client():
+    init_google()
+    from google.cloud import texttospeech_v1beta1
+    return texttospeech_v1beta1.TextToSpeechClient()
+
+
+MODEL_NAME = "gemini-2.5-flash"
+GEMINI_POOL_SIZE = int(os.getenv("APRENDIA_GEMINI_POOL_SIZE", "4"))
+TTS_POOL_SIZE = int(os.getenv("APRENDIA_TTS_POOL_SIZE", "4"))
+
+
+class ClientPool:
+    """
+    Thread-safe pool of shared API clients.
+
+    The Vertex AI and TTS clients are thread-safe, so clients are not checked
+    out exclusively: calls are spread round-robin over up to `size` clients,
+    which are created lazily and reused, so channel setup and auth handshakes
+    happen once per client rather than once per request. The size bounds the
+    number of connections, not the number of concurrent calls.
+    """
+
+    def __init__(self, factory, size: int):
+        self._factory = factory
+        self.size = max(1, size)
+        self._clients = []
+        self._creating = 0
+        self._next = 0
+        self._cond = threading.Condition()
+
+    def _create(self):
+        """Create a client for a slot already reserved in `_creating`."""
+        try:
+            client = self._factory()
+        except Exception:
+            with self._cond:
+                self._creating -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._creating -= 1
+            self._clients.append(client)
+            self._cond.notify_all()
+        return client
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if len(self._clients) + self._creating < self.size:
+                    self._creating += 1
+                    break
+                if self._clients:
+                    client = self._clients[self._next % len(self._clients)]
+                    self._next += 1
+                    return client
+                # Every slot is being created; wait for the first client
+                self._cond.wait()
+        return self._create()
+
+    @contextmanager
+    def client(self):
+        yield self._acquire()
+
+    def warm(self, count: int = None):
+        """Create up to `count` (default: all) clients ahead of the first request."""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._cond:
+                if len(self._clients) + self._creating >= count:
+                    return
+                self._creating += 1
+            self._create()
+
+
+gemini_pool = ClientPool(_gemini_model, GEMINI_POOL_SIZE)
+tts_pool = ClientPool(_tts_client, TTS_POOL_SIZE)
+# SSML mark timepoints are only returned by the v1beta1 API
+tts_beta_pool = ClientPool(_tts_beta_client, TTS_POOL_SIZE)
+
+# Google TTS rejects inputs over 5000 bytes; leave room for the SSML wrapper
+SSML_MAX_BYTES = 4500
+
+
+def warm_clients():
+    """Initialise Google access and create the pooled Gemini and TTS clients up front."""
+    try:
+        init_google()
+        gemini_pool.warm()
+        tts_pool.warm()
+        tts_beta_pool.warm()
+    except Exception as e:
+        # Requests will retry the setup on first use
+        logging.warning(f"Could not warm Google clients: {e}")
+        return
+    logging.info(f"Warmed {gemini_pool.size} Gemini and {tts_pool.size} TTS clients")
+
 
 # Initialize the Vertex AI SDK
-def generate_text(prompt: str) -> str:
-    
+def generate_text(prompt: str, cache: bool = True, kind: str = "other") -> str:
+    """
+    Generate text with Gemini.
+
+    Responses are served from the LLM cache when `cache` is set; creative
+    prompts that should differ on every call pass `cache=False`. `kind`
+    (title, story, translation, quiz, ...) labels the latency metrics.
+    """
+    model_name = MODEL_NAME
+    if cache:
+        cached = get_llm_cache().get(model_name, prompt)
+        if cached is not None:
+            logging.info("generate_text: cache hit")
+            return cached
+
     logging.info(f"generate_text: {prompt}")
-    model_name = "gemini-2.5-flash"
-    model = GenerativeModel(model_name)
+    def request():
+        with gemini_pool.client() as model:
+            return model.generate_content(prompt)
+    with observe_call(llm_latency, "llm", kind=kind, method="text"):
+        response = llm_calls.call(kind, request)
 
-    response = model.generate_content(prompt)
+    if cache:
+        get_llm_cache().put(model_name, prompt, response.text)
+    return response.text
+
+def generate_structured(prompt: str, response_schema: dict, cache: bool = True,
+                        kind: str = "other") -> str:
+    """Generate a JSON response constrained to `response_schema`; returns the raw JSON text."""
+    cache_model = f"{MODEL_NAME}:{json.dumps(response_schema, sort_keys=True)}"
+    if cache:
+        cached = get_llm_cache().get(cache_model, prompt)
+        if cached is not None:
+            logging.info("generate_structured: cache hit")
+            return cached
+
+    logging.info(f"generate_structured: {prompt}")
+    from vertexai.preview.generative_models import GenerationConfig
+    config = GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=response_schema,
+    )
+    def request():
+        with gemini_pool.client() as model:
+            return model.generate_content(prompt, generation_config=config)
+    with observe_call(llm_latency, "llm", kind=kind, method="structured"):
+        response = llm_calls.call(kind, request)
 
+    if cache:
+        get_llm_cache().put(cache_model, prompt, response.text)
     return response.text
 
-def synthesize_tts(locale: str, text: str) -> bytes:
+
+def generate_text_stream(prompt: str, kind: str = "other"):
+    """
+    Stream Gemini output and yield each line as soon as it is complete.
+
+    Streamed responses are never cached.
+    """
+    logging.info(f"generate_text_stream: {prompt}")
+    def chunks():
+        with gemini_pool.client() as model:
+            for chunk in model.generate_content(prompt, stream=True):
+                yield chunk.text
+    buffer = ""
+    with observe_call(llm_latency, "llm", kind=kind, method="stream"):
+        for text in llm_calls.stream(kind, chunks):
+            buffer += text
+            while "\n" in buffer:
+                line, buffer = buffer.split("\n", 1)
+                yield line
+    if buffer:
+        yield buffer
+
+
+def synthesize_tts(locale: str, text: str, profile: str = CANONICAL_PROFILE) -> bytes:
     logging.info(f"synthesize_tts: {text}")
-    client = texttospeech.TextToSpeechClient()
+    from google.cloud import texttospeech
     input_text = texttospeech.SynthesisInput(text=text)
     voice = texttospeech.VoiceSelectionParams(language_code=locale, model_name='en-US-Chirp3-HD-Leda')
-    audio_cfg = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
-    response = client.synthesize_speech(input=input_text, voice=voice, audio_config=audio_cfg)
+    encoding = AUDIO_PROFILES[profile]
+    audio_cfg = texttospeech.AudioConfig(
+        audio_encoding=getattr(texttospeech.AudioEncoding, encoding.encoding),
+        **({"sample_rate_hertz": encoding.sample_rate_hertz} if encoding.sample_rate_hertz else {})
+    )
+    with observe_call(tts_latency, "tts", locale=locale, method="single"):
+        with tts_pool.client() as client:
+            response = client.synthesize_speech(input=input_text, voice=voice, audio_config=audio_cfg)
     return response.audio_content
 
 
-async def async_tts_gemini(text, filename, lang='en-US'):
+def _ssml_batches(texts: list) -> list:
+    """Group sentence indexes so that each SSML document stays under the size limit."""
+    batches, current, size = [], [], 0
+    for i, text in enumerate(texts):
+        item = len(escape(text).encode()) + 32
+        if current and size + item > SSML_MAX_BYTES:
+            batches.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += item
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Encodings whose audio can be cut at SSML marks without re-encoding
+_SPLITTERS = {"MP3": split_mp3, "OGG_OPUS": split_ogg_opus}
+# Errors with which the service refuses the SSML request itself, e.g. a voice
+# without <mark> or time pointing support. Matched by class name, as in
+# src.retry, so google.api_core is not needed here.
+_SSML_REJECTED = ("InvalidArgument", "FailedPrecondition")
+# Locales whose voice rejected SSML batches; they use per-sentence requests
+_ssml_unsupported = set()
+
+
+def _synthesize_ssml_batch(locale: str, texts: list, profile: str = CANONICAL_PROFILE) -> list:
+    """One TTS request for all `texts`, split at the SSML mark before each sentence."""
+    from google.cloud import texttospeech_v1beta1
+    encoding = AUDIO_PROFILES[profile]
+    ssml = "<speak>" + "".join(
+        f'<mark name="s{i}"/>{escape(text)} ' for i, text in enumerate(texts)
+    ) + "</speak>"
+    request = texttospeech_v1beta1.SynthesizeSpeechRequest(
+        input=texttospeech_v1beta1.SynthesisInput(ssml=ssml),
+        voice=texttospeech_v1beta1.VoiceSelectionParams(language_code=locale, model_name='en-US-Chirp3-HD-Leda'),
+        audio_config=texttospeech_v1beta1.AudioConfig(
+            audio_encoding=getattr(texttospeech_v1beta1.AudioEncoding, encoding.encoding),
+            **({"sample_rate_hertz": encoding.sample_rate_hertz} if encoding.sample_rate_hertz else {})
+        ),
+        enable_time_pointing=[
+            texttospeech_v1beta1.SynthesizeSpeechRequest.TimepointType.SSML_MARK
+        ],
+    )
+    with observe_call(tts_latency, "tts", locale=locale, method="ssml_batch"):
+        with tts_beta_pool.client() as client:
+            response = client.synthesize_speech(request=request)
+
+    marks = {tp.mark_name: tp.time_seconds for tp in response.timepoints}
+    cut_times = [marks.get(f"s{i}") for i in range(1, len(texts))]
+    if any(t is None for t in cut_times):
+        raise ValueError(f"TTS returned {len(marks)} usable marks for {len(texts)} sentences")
+    if any(t <= previous for previous, t in zip([0.0] + cut_times, cut_times)):
+        raise ValueError(f"TTS mark times {cut_times} are not strictly increasing")
+    segments = _SPLITTERS[encoding.encoding](response.audio_content, cut_times)
+    # Marks past the end of the audio, or closer than one frame, leave a
+    # sentence without audio; an empty file would be cached for good
+    if not all(segments):
+        raise ValueError(f"TTS marks left {segments.count(b'')} of {len(texts)} sentences without audio")
+    return segments
+
+
+def synthesize_tts_batch(locale: str, texts: list, profile: str = CANONICAL_PROFILE) -> list:
+    """
+    Synthesize several sentences with as few TTS requests as possible.
+
+    Sentences are sent as SSML documents with a <mark> before each one and the
+    returned audio is split at the mark timepoints. If the service does not
+    return the expected marks, that batch falls back to per-sentence requests,
+    as do profiles whose encoding cannot be split. If the service rejects the
+    SSML request, the locale uses per-sentence requests from then on.
+    """
+    logging.info(f"synthesize_tts_batch: {len(texts)} {profile} sentences for {locale}")
+    splittable = AUDIO_PROFILES[profile].encoding in _SPLITTERS
+    results = [None] * len(texts)
+    for batch in _ssml_batches(texts):
+        batch_texts = [texts[i] for i in batch]
+        if len(batch_texts) == 1 or not splittable or locale in _ssml_unsupported:
+            segments = [synthesize_tts(locale, text, profile) for text in batch_texts]
+        else:
+            try:
+                segments = _synthesize_ssml_batch(locale, batch_texts, profile)
+            except ValueError as e:
+                logging.warning(f"synthesize_tts_batch: {e}; falling back to per-sentence TTS")
+                segments = [synthesize_tts(locale, text, profile) for text in batch_texts]
+            except Exception as e:
+                if type(e).__name__ not in _SSML_REJECTED:
+                    raise
+                _ssml_unsupported.add(locale)
+                logging.warning(f"synthesize_tts_batch: {locale} voice rejected SSML marks ({e}); "
+                                f"using per-sentence TTS")
+                segments = [synthesize_tts(locale, text, profile) for text in batch_texts]
+        for i, segment in zip(batch, segments):
+            results[i] = segment
+    return results
+
+
+async def async_tts_gemini(text, filename, lang='en-US', limit=None):
+    """
+    Make sure `text` has audio at `filename` and in the extra profiles.
+    Only TTS requests that actually run go through `limit` (see `async_cached_audio`).
+    """
     def helper():
         return synthesize_tts(lang, text)
-    # Run the blocking TTS call in a thread
-    audio_content = await asyncio.to_thread(helper)
+    # Existing files are reused; the blocking TTS call runs in a thread
+    result = await async_cached_audio(filename, helper, limit)
+    await async_tts_variants([text], lang, limit)
+    return result
+
+
+async def async_tts_gemini_batch(texts, filenames, lang='en-US', limit=None):
+    """Batched counterpart of `async_tts_gemini` for all sentences of one locale."""
+    def helper(positions):
+        return synthesize_tts_batch(lang, [texts[i] for i in positions])
+    await async_cached_audio_batch(list(filenames), helper, limit)
+
+    def variant_helper(profile):
+        return lambda positions: synthesize_tts_batch(lang, [texts[i] for i in positions], profile)
+    # Each extra profile is batched the same way as the MP3 master
+    await asyncio.gather(*(
+        async_cached_audio_batch([get_audio_write_fname(lang, text, profile) for text in texts],
+                                 variant_helper(profile), limit)
+        for profile in profiles_for(lang)[1:]
+    ))
+
 
-    # Write the file asynchronously
-    async with aiofiles.open(filename, "wb") as f:
-        await f.write(audio_content)
\ No newline at end of file
+async def async_tts_variants(texts, lang, limit=None):
+    """Encode `texts` in the locale's extra audio profiles (see `profiles_for`)."""
+    def helper(text, profile):
+        return lambda: synthesize_tts(lang, text, profile)
+    await asyncio.gather(*(
+        async_cached_audio(get_audio_write_fname(lang, text, profile), helper(text, profile), limit)
+        for profile in profiles_for(lang)[1:]
+        for text in dict.fromkeys(texts)
+    ))
@@ -0,0 +1,116 @@
+"""
+Secondary indexes over the in-memory `db` dict.
+
+The API looks studiables up by story and sentences up by studiable on every
+poll. These indexes are maintained as records are added so those lookups cost
+O(result size) rather than a scan over the whole database.
+
+Every change also gets a version number from a single increasing sequence,
+which backs the API's ETags and `?since=` change cursors. Versions follow the
+clock in microseconds, so versions handed out by different worker processes
+stay roughly comparable.
+"""
+import threading
+import time
+from array import array
+from bisect import insort
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+from src.models import Studiable
+
+
+class DbIndex:
+    def __init__(self):
+        self.story_ids: List[int] = []  # ascending, for cursor pagination
+        self.story_studiables: Dict[int, List[int]] = defaultdict(list)  # ascending
+        # The studiables' own id arrays, shared rather than copied
+        self.studiable_sentences: Dict[int, Sequence[int]] = {}
+
+        # Versions start from the clock so they keep increasing across restarts
+        self.version = int(time.time() * 1_000_000)
+        self.stories_version = self.version  # last change to any story
+        self.story_versions: Dict[int, int] = {}  # last change to a story or its studiables
+        self.studiable_versions: Dict[int, int] = {}
+        # Per studiable, the version each sentence was added at, parallel to its ids
+        self.sentence_versions: Dict[int, array] = {}
+        self._version_lock = threading.Lock()
+
+    def clear(self):
+        self.story_ids.clear()
+        self.story_studiables.clear()
+        self.studiable_sentences.clear()
+        self.story_versions.clear()
+        self.studiable_versions.clear()
+        self.sentence_versions.clear()
+
+    def _next_version(self) -> int:
+        with self._version_lock:
+            self.version = max(self.version + 1, int(time.time() * 1_000_000))
+            return self.version
+
+    def touch_story(self, story_id: int) -> int:
+        """Record a change to a story itself."""
+        v = self._next_version()
+        self.story_versions[story_id] = v
+        self.stories_version = v
+        return v
+
+    def touch_studiable(self, studiable: Studiable) -> int:
+        """Record a change to a studiable (its text, metadata or sentences)."""
+        v = self._next_version()
+        self.studiable_versions[studiable.id] = v
+        self.story_versions[studiable.story_id] = v
+        return v
+
+    def rebuild(self, db: Dict):
+        """Rebuild all indexes from scratch, e.g. after loading from storage."""
+        self.clear()
+        for story_id in sorted(db["stories"]):
+            self.add_story(story_id)
+        for studiable in sorted(db["studiables"].values(), key=lambda s: s.id):
+            self.add_studiable(studiable)
+            self.set_sentences(studiable)
+
+    def add_story(self, story_id: int):
+        # Usually appends; ids allocated by other processes can arrive out of order
+        insort(self.story_ids, story_id)
+        self.touch_story(story_id)
+
+    def add_studiable(self, studiable: Studiable):
+        insort(self.story_studiables[studiable.story_id], studiable.id)
+        self.touch_studiable(studiable)
+
+    def set_sentences(self, studiable: Studiable):
+        """Record the current sentence ids of a studiable."""
+        old = dict(zip(self.studiable_sentences.get(studiable.id, ()),
+                       self.sentence_versions.get(studiable.id, ())))
+        self.studiable_sentences[studiable.id] = studiable.sentence_ids
+        v = self.touch_studiable(studiable)
+        self.sentence_versions[studiable.id] = array(
+            "q", (old.get(sid, v) for sid in studiable.sentence_ids)
+        )
+
+    def add_sentence(self, studiable: Studiable, sentence_id: int):
+        """Record a sentence id just appended to `studiable.sentence_ids`."""
+        self.studiable_sentences[studiable.id] = studiable.sentence_ids
+        self.sentence_versions.setdefault(studiable.id, array("q")).append(
+            self.touch_studiable(studiable)
+        )
+
+    def studiable_ids(self, story_id: int) -> List[int]:
+        return self.story_studiables.get(story_id, [])
+
+    def sentence_ids(self, studiable_id: int) -> Sequence[int]:
+        return self.studiable_sentences.get(studiable_id, [])
+
+    def sentence_ids_since(self, studiable_id: int, since: int) -> List[int]:
+        """Ids of a studiable's sentences added after version `since`."""
+        return [
+            sid for sid, v in zip(self.sentence_ids(studiable_id),
+                                  self.sentence_versions.get(studiable_id, ()))
+            if v > since
+        ]
+
+
+index = DbIndex()
@@ -0,0 +1,266 @@
+"""
+Durable, prioritised job queue for generation work.
+
+Jobs are recorded in an SQLite table before they are queued, so work that was
+queued or running when the process stopped is picked up again at startup.
+A fixed pool of worker threads runs jobs in priority order (lower first),
+FIFO within a priority. A job whose handler raises is queued again until it
+has run JOB_MAX_ATTEMPTS times, then marked failed.
+
+The table is the queue: workers claim jobs with a conditional UPDATE, so any
+number of processes can share one database and each job runs exactly once.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from src.storage import DB_PATH
+
+JOBS_DB_PATH = os.getenv("APRENDIA_JOBS_PATH", DB_PATH)
+JOB_WORKERS = int(os.getenv("APRENDIA_JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("APRENDIA_JOB_QUEUE_MAX", "100"))
+# Runs per job; a job that raises is queued again until it has used them all
+JOB_MAX_ATTEMPTS = int(os.getenv("APRENDIA_JOB_MAX_ATTEMPTS", "3"))
+# Seconds between checks for jobs queued by other processes
+JOB_POLL_INTERVAL = float(os.getenv("APRENDIA_JOB_POLL_INTERVAL", "0.5"))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "bulk": PRIORITY_BULK}
+
+
+class QueueFull(Exception):
+    """Raised when the queue already holds JOB_QUEUE_MAX pending jobs."""
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: Dict
+    priority: int = PRIORITY_INTERACTIVE
+    status: str = "queued"  # queued, running, done, failed
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+
+class JobQueue:
+    def __init__(self, path: str = JOBS_DB_PATH, workers: int = JOB_WORKERS,
+                 max_depth: int = JOB_QUEUE_MAX):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_depth = max_depth
+        self._handlers: Dict[str, Callable[[Dict], None]] = {}
+        self._cond = threading.Condition()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                "payload TEXT NOT NULL, priority INTEGER NOT NULL, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, owner_pid INTEGER)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "owner_pid" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(status, priority, id)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def register(self, kind: str, handler: Callable[[Dict], None]):
+        """Register the function that runs jobs of `kind` with their payload."""
+        self._handlers[kind] = handler
+
+    def _save(self, job: Job):
+        job.updated_at = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = ?, error = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (job.status, job.attempts, job.error, job.updated_at, job.id),
+                )
+
+    def enqueue(self, kind: str, payload: Dict, priority: int = PRIORITY_INTERACTIVE) -> Job:
+        """Record a job durably and queue it. Raises QueueFull when the queue is at capacity."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        now = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            # BEGIN IMMEDIATE holds the write lock from the depth check to the
+            # insert, so processes enqueueing together cannot overshoot max_depth
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                (depth,) = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+                ).fetchone()
+                if depth >= self.max_depth:
+                    raise QueueFull(f"Job queue is full ({self.max_depth} pending)")
+                cur = conn.execute(
+                    "INSERT INTO jobs (kind, payload, priority, status, attempts, error, "
+                    "created_at, updated_at) VALUES (?, ?, ?, 'queued', 0, NULL, ?, ?)",
+                    (kind, json.dumps(payload), priority, now, now),
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        with self._cond:
+            self._cond.notify()
+        return Job(id=cur.lastrowid, kind=kind, payload=payload, priority=priority,
+                   created_at=now, updated_at=now)
+
+    def _claim(self) -> Optional[Job]:
+        """Mark the next queued job as running in this process and return it."""
+        with self._db_lock:
+            conn = self._connect()
+            while True:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' "
+                    "ORDER BY priority, id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                with conn:
+                    # Another process may claim the same row first; then try the next
+                    cur = conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                        "owner_pid = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                        (os.getpid(), time.time(), row[0]),
+                    )
+                if cur.rowcount == 1:
+                    return self._row_to_job(conn.execute(
+                        "SELECT id, kind, payload, priority, status, attempts, error, "
+                        "created_at, updated_at FROM jobs WHERE id = ?", (row[0],)
+                    ).fetchone())
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT id, kind, payload, priority, status, attempts, error, created_at, "
+                "updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        return Job(id=row[0], kind=row[1], payload=json.loads(row[2]), priority=row[3],
+                   status=row[4], attempts=row[5], error=row[6], created_at=row[7],
+                   updated_at=row[8])
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker, across all processes."""
+        with self._db_lock:
+            (depth,) = self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()
+        return depth
+
+    def stats(self) -> Dict:
+        with self._db_lock:
+            counts = dict(self._connect().execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall())
+        return {"depth": counts.get("queued", 0), "workers": self.workers, "jobs": counts}
+
+    @staticmethod
+    def _pid_alive(pid: Optional[int]) -> bool:
+        if not pid or pid == os.getpid():
+            # Our own pid on a running job can only be left over from a previous run
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def start(self):
+        """Re-queue jobs whose process has stopped and start the workers."""
+        with self._db_lock:
+            conn = self._connect()
+            running = conn.execute(
+                "SELECT id, owner_pid FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            orphaned = [job_id for job_id, pid in running if not self._pid_alive(pid)]
+            with conn:
+                conn.executemany(
+                    "UPDATE jobs SET status = 'queued', owner_pid = NULL "
+                    "WHERE id = ? AND status = 'running'",
+                    [(job_id,) for job_id in orphaned],
+                )
+        queued = self.depth()
+        if queued:
+            logging.info(f"Resuming {queued} queued jobs ({len(orphaned)} interrupted)")
+
+        self._stopping = False
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=1)
+        self._threads = []
+
+    def _work(self):
+        while True:
+            job = None
+            with self._cond:
+                while not self._stopping:
+                    job = self._claim()
+                    if job is not None:
+                        break
+                    # Woken by local enqueues; the timeout picks up other processes' jobs
+                    self._cond.wait(JOB_POLL_INTERVAL)
+                if self._stopping:
+                    if job is not None:
+                        job.status = "queued"
+                        job.attempts -= 1
+                        self._save(job)
+                    return
+
+            try:
+                self._handlers[job.kind](job.payload)
+                job.status = "done"
+                job.error = None
+            except Exception as e:
+                logging.exception(f"Job {job.id} ({job.kind}) failed, attempt {job.attempts}")
+                job.status = "queued" if job.attempts < JOB_MAX_ATTEMPTS else "failed"
+                job.error = str(e)
+            self._save(job)
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
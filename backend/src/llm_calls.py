@@ -0,0 +1,260 @@
+"""
+Deadlines, retries and hedging for Gemini requests.
+
+Each request runs on a worker thread while the caller waits. The caller
+waits at most the deadline for the prompt kind, covering every attempt.
+Throttling and transient errors are retried with jittered backoff while
+time remains. With hedging on, a second copy of a request is sent once the
+first has taken longer than the kind's recent p95 latency, and whichever
+answers first wins.
+
+At most LLM_MAX_OUTSTANDING requests run per process, counting abandoned
+attempts that are still in flight, so a slow service cannot pile up
+threads. A request that misses its deadline raises TimeoutError.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, Optional
+
+from src.metrics import registry
+from src.retry import backoff_delay, classify_error
+
+# Seconds a generate call may take, including retries, by prompt kind.
+# APRENDIA_LLM_DEADLINE_<KIND> overrides one kind; APRENDIA_LLM_DEADLINE
+# applies to kinds not listed here.
+DEFAULT_DEADLINES = {
+    "title": 20.0,
+    "summary": 45.0,
+    "translation": 60.0,
+    "quiz": 60.0,
+    "story": 90.0,
+}
+LLM_DEADLINE = float(os.getenv("APRENDIA_LLM_DEADLINE", "60"))
+LLM_RETRIES = int(os.getenv("APRENDIA_LLM_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("APRENDIA_LLM_BACKOFF_BASE", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("APRENDIA_LLM_BACKOFF_MAX", "10"))
+LLM_MAX_OUTSTANDING = int(os.getenv("APRENDIA_LLM_MAX_OUTSTANDING", "16"))
+# 1 = send a duplicate request once the first is slower than the kind's p95
+LLM_HEDGE = os.getenv("APRENDIA_LLM_HEDGE", "0") == "1"
+LLM_HEDGE_QUANTILE = float(os.getenv("APRENDIA_LLM_HEDGE_QUANTILE", "0.95"))
+# Latencies observed before a kind is hedged, and how many are kept
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_LATENCY_WINDOW = 500
+
+llm_retries = registry.counter(
+    "aprendia_llm_retries_total",
+    "Gemini requests retried after an error, by prompt kind and error class.",
+    ("kind", "reason"),
+)
+llm_hedges = registry.counter(
+    "aprendia_llm_hedges_total",
+    "Duplicate Gemini requests sent because the first passed the kind's p95 latency.",
+    ("kind",),
+)
+llm_hedge_wins = registry.counter(
+    "aprendia_llm_hedge_wins_total",
+    "Hedged Gemini requests whose duplicate answered first.",
+    ("kind",),
+)
+llm_deadline_exceeded = registry.counter(
+    "aprendia_llm_deadline_exceeded_total",
+    "Gemini requests abandoned at their deadline, by prompt kind.",
+    ("kind",),
+)
+llm_outstanding = registry.gauge(
+    "aprendia_llm_outstanding",
+    "Gemini requests in flight in this process, including abandoned attempts.",
+)
+
+
+def deadline_for(kind: str) -> float:
+    override = os.getenv(f"APRENDIA_LLM_DEADLINE_{kind.upper()}")
+    if override:
+        return float(override)
+    return DEFAULT_DEADLINES.get(kind, LLM_DEADLINE)
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful requests, per kind."""
+
+    def __init__(self, size: int = LLM_LATENCY_WINDOW):
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=size))
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, seconds: float):
+        with self._lock:
+            self._samples[kind].append(seconds)
+
+    def quantile(self, kind: str, q: float) -> Optional[float]:
+        """The `q` quantile of the kind's latencies, or None until enough are seen."""
+        with self._lock:
+            samples = sorted(self._samples[kind])
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+latencies = LatencyWindow()
+_slots = threading.BoundedSemaphore(max(1, LLM_MAX_OUTSTANDING))
+# One thread per slot, so submitted attempts never queue behind each other
+_executor = ThreadPoolExecutor(max_workers=max(1, LLM_MAX_OUTSTANDING),
+                               thread_name_prefix="llm")
+
+
+def _deadline_error(kind: str, deadline: float) -> TimeoutError:
+    llm_deadline_exceeded.inc(kind=kind)
+    return TimeoutError(f"Gemini {kind} request exceeded its {deadline_for(kind):g}s deadline")
+
+
+def _acquire_slot(kind: str, deadline: float):
+    if not _slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        raise _deadline_error(kind, deadline)
+    llm_outstanding.inc()
+
+
+def _release_slot():
+    llm_outstanding.dec()
+    _slots.release()
+
+
+def _submit(kind: str, fn: Callable, record: bool = True):
+    """Run `fn` on a worker thread that holds an already acquired slot."""
+    def run():
+        start = time.monotonic()
+        try:
+            result = fn()
+        finally:
+            _release_slot()
+        if record:
+            latencies.record(kind, time.monotonic() - start)
+        return result
+    return _executor.submit(run)
+
+
+def _attempt(kind: str, fn: Callable, deadline: float):
+    """One request, plus a hedge if it runs long; raises the first failure."""
+    _acquire_slot(kind, deadline)
+    start = time.monotonic()
+    futures = [_submit(kind, fn)]
+    hedge_at = None
+    if LLM_HEDGE:
+        p95 = latencies.quantile(kind, LLM_HEDGE_QUANTILE)
+        if p95 is not None:
+            hedge_at = start + p95
+    while True:
+        wake = deadline if hedge_at is None else min(deadline, hedge_at)
+        done, _ = wait(futures, timeout=max(0.0, wake - time.monotonic()),
+                       return_when=FIRST_COMPLETED)
+        for future in futures:
+            if future in done and future.exception() is None:
+                if future is not futures[0]:
+                    llm_hedge_wins.inc(kind=kind)
+                return future.result()
+        if done:
+            pending = [f for f in futures if f not in done]
+            if not pending:
+                raise next(iter(done)).exception()
+            # One copy failed; keep waiting for the other
+            futures = pending
+            continue
+        now = time.monotonic()
+        if now >= deadline:
+            raise _deadline_error(kind, deadline)
+        if hedge_at is not None and now >= hedge_at:
+            hedge_at = None
+            # Only hedge with spare capacity; a hedge must not wait for a slot
+            if _slots.acquire(blocking=False):
+                llm_outstanding.inc()
+                llm_hedges.inc(kind=kind)
+                futures.append(_submit(kind, fn))
+
+
+def _retry_delay(kind: str, e: Exception, attempt: int, deadline: float) -> Optional[float]:
+    """Seconds to wait before retrying after `e`, or None to give up."""
+    reason = classify_error(e)
+    if reason is None or attempt >= LLM_RETRIES:
+        return None
+    delay = backoff_delay(attempt, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX)
+    if time.monotonic() + delay >= deadline:
+        return None
+    llm_retries.inc(kind=kind, reason=reason)
+    logging.warning(f"Gemini {kind} request failed ({reason}: {e}); retrying in {delay:.1f}s")
+    return delay
+
+
+def call(kind: str, fn: Callable):
+    """Return `fn()` (one blocking Gemini request) within the deadline for `kind`."""
+    deadline = time.monotonic() + deadline_for(kind)
+    attempt = 0
+    while True:
+        try:
+            return _attempt(kind, fn, deadline)
+        except Exception as e:
+            delay = _retry_delay(kind, e, attempt, deadline)
+            if delay is None:
+                raise
+        time.sleep(delay)
+        attempt += 1
+
+
+_END = object()
+
+
+def stream(kind: str, open_stream: Callable[[], Iterator[str]]) -> Iterator[str]:
+    """
+    Yield the chunks of `open_stream()` within the deadline for `kind`.
+
+    The stream is read on a worker thread. Until the first chunk arrives a
+    failed stream is retried like `call`; after that, errors are raised, since
+    the caller has already used part of the output. Streams are not hedged.
+    """
+    deadline = time.monotonic() + deadline_for(kind)
+    attempt = 0
+    while True:
+        chunks: queue.Queue = queue.Queue()
+        stop = threading.Event()
+
+        # Bind this attempt's queue and event; a retry makes new ones
+        def pump(chunks=chunks, stop=stop):
+            it = open_stream()
+            try:
+                for chunk in it:
+                    if stop.is_set():
+                        break
+                    chunks.put(chunk)
+                chunks.put(_END)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                close = getattr(it, "close", None)
+                if close is not None:
+                    close()
+
+        _acquire_slot(kind, deadline)
+        _submit(kind, pump, record=False)
+        started = False
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise _deadline_error(kind, deadline) from None
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                started = True
+                yield item
+        except Exception as e:
+            delay = None if started else _retry_delay(kind, e, attempt, deadline)
+            if delay is None:
+                raise
+        finally:
+            stop.set()
+        time.sleep(delay)
+        attempt += 1
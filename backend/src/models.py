@@ -1,7 +1,20 @@
-from typing import Dict, List
+import re
+import sys
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional
 from dataclasses import dataclass, field
 
-@dataclass
+# Records are kept compact because a large corpus lives in memory: sentence
+# pairs are stored column-wise (see SentenceStore), studiables reference their
+# sentences by id, locale strings are interned, and audio is kept as a 64-bit
+# content hash from which the URL is rebuilt on the way out.
+
+AUDIO_URL_PREFIX = "/audio/"
+_AUDIO_URL = re.compile(r"^/audio/([A-Za-z0-9_-]+)/\1_([0-9a-f]{16})\.mp3$")
+
+
+@dataclass(slots=True)
 class SentencePair:
     id: int
     source_text: str
@@ -10,16 +23,209 @@ class SentencePair:
     target_audio: str = ""
     order: int = 0
 
-@dataclass
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "source_text": self.source_text,
+            "target_text": self.target_text,
+            "source_audio": self.source_audio,
+            "target_audio": self.target_audio,
+            "order": self.order,
+        }
+
+
+class SentenceStore:
+    """
+    Column store for sentence pairs, used as `db["sentences"]`.
+
+    Behaves like a dict of sentence id -> SentencePair, but keeps each field
+    in a flat array or list, so a sentence costs its two texts plus a few
+    dozen bytes instead of an object, a dict entry and two URL strings.
+    Reading an item builds a fresh SentencePair; store it again to change it.
+    Sentence ids are allocated densely, so rows are found by id offset.
+    """
+
+    _NO_AUDIO = 0  # locale slot for an empty URL
+    _RAW_URL = 1  # locale slot for a URL that is not a content-addressed file
+
+    def __init__(self):
+        self._rows = array("q")  # sentence id -> row, -1 if absent
+        self._ids = array("q")  # row -> sentence id, -1 if free
+        self._source_text: List[Optional[str]] = []
+        self._target_text: List[Optional[str]] = []
+        self._locales = array("H")  # 2 per row: source, target
+        self._hashes = array("Q")  # 2 per row: source, target
+        self._order = array("l")
+        self._free: List[int] = []
+        self._raw_urls: Dict[int, str] = {}  # 2 * row + side -> URL
+        self._locale_names: List[Optional[str]] = [None, None]
+        self._locale_index: Dict[str, int] = {}
+        self._lock = threading.Lock()  # rows are allocated across several arrays
+
+    def _locale_id(self, locale: str) -> int:
+        i = self._locale_index.get(locale)
+        if i is None:
+            i = self._locale_index[locale] = len(self._locale_names)
+            self._locale_names.append(sys.intern(locale))
+        return i
+
+    def _pack_audio(self, slot: int, url: str):
+        self._raw_urls.pop(slot, None)
+        m = _AUDIO_URL.match(url) if url else None
+        if m is not None:
+            self._locales[slot] = self._locale_id(m.group(1))
+            self._hashes[slot] = int(m.group(2), 16)
+            return
+        self._locales[slot] = self._RAW_URL if url else self._NO_AUDIO
+        self._hashes[slot] = 0
+        if url:
+            self._raw_urls[slot] = url
+
+    def _audio_url(self, slot: int) -> str:
+        locale_id = self._locales[slot]
+        if locale_id == self._NO_AUDIO:
+            return ""
+        if locale_id == self._RAW_URL:
+            return self._raw_urls[slot]
+        locale = self._locale_names[locale_id]
+        return f"{AUDIO_URL_PREFIX}{locale}/{locale}_{self._hashes[slot]:016x}.mp3"
+
+    def _row(self, sentence_id: int) -> int:
+        if 0 <= sentence_id < len(self._rows):
+            return self._rows[sentence_id]
+        return -1
+
+    def __setitem__(self, sentence_id: int, sp: SentencePair):
+        with self._lock:
+            self._set(sentence_id, sp)
+
+    def _set(self, sentence_id: int, sp: SentencePair):
+        row = self._row(sentence_id)
+        if row < 0:
+            if self._free:
+                row = self._free.pop()
+                self._ids[row] = sentence_id
+            else:
+                row = len(self._ids)
+                self._ids.append(sentence_id)
+                self._source_text.append(None)
+                self._target_text.append(None)
+                self._locales.extend((0, 0))
+                self._hashes.extend((0, 0))
+                self._order.append(0)
+            if sentence_id >= len(self._rows):
+                self._rows.extend([-1] * (sentence_id + 1 - len(self._rows)))
+            self._rows[sentence_id] = row
+        self._source_text[row] = sp.source_text
+        self._target_text[row] = sp.target_text
+        self._pack_audio(2 * row, sp.source_audio)
+        self._pack_audio(2 * row + 1, sp.target_audio)
+        self._order[row] = sp.order
+
+    def __getitem__(self, sentence_id: int) -> SentencePair:
+        row = self._row(sentence_id)
+        if row < 0:
+            raise KeyError(sentence_id)
+        # Reads take no lock; if the row was freed (and maybe reused) meanwhile,
+        # the id check below catches it
+        try:
+            sp = SentencePair(
+                id=sentence_id,
+                source_text=self._source_text[row],
+                target_text=self._target_text[row],
+                source_audio=self._audio_url(2 * row),
+                target_audio=self._audio_url(2 * row + 1),
+                order=self._order[row],
+            )
+        except KeyError:
+            raise KeyError(sentence_id) from None
+        if self._ids[row] != sentence_id:
+            raise KeyError(sentence_id)
+        return sp
+
+    def __delitem__(self, sentence_id: int):
+        with self._lock:
+            row = self._row(sentence_id)
+            if row < 0:
+                raise KeyError(sentence_id)
+            self._rows[sentence_id] = -1
+            self._ids[row] = -1
+            self._source_text[row] = self._target_text[row] = None
+            self._raw_urls.pop(2 * row, None)
+            self._raw_urls.pop(2 * row + 1, None)
+            self._free.append(row)
+
+    def get(self, sentence_id: int, default=None):
+        try:
+            return self[sentence_id]
+        except KeyError:
+            return default
+
+    def pop(self, sentence_id: int, *default):
+        try:
+            sp = self[sentence_id]
+            del self[sentence_id]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        return sp
+
+    def __contains__(self, sentence_id) -> bool:
+        return isinstance(sentence_id, int) and self._row(sentence_id) >= 0
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._free)
+
+    def __iter__(self) -> Iterator[int]:
+        return (sid for sid in self._ids if sid >= 0)
+
+    def keys(self) -> Iterator[int]:
+        return iter(self)
+
+    def values(self) -> Iterator[SentencePair]:
+        return (self[sid] for sid in self)
+
+    def items(self):
+        return ((sid, self[sid]) for sid in self)
+
+    def clear(self):
+        self.__init__()
+
+
+@dataclass(slots=True)
 class Studiable:
     id: int
     story_id: int
     title: str
     raw_text: str
     metadata: Dict
-    sentences: List[SentencePair] = field(default_factory=list)
+    sentence_ids: array = field(default_factory=lambda: array("q"))
 
-@dataclass
+    # Fields exposed by the API (see to_dict)
+    FIELDS = ("id", "story_id", "title", "raw_text", "metadata", "sentences")
+
+    @property
+    def sentences(self) -> List[SentencePair]:
+        """The studiable's sentence pairs, read from `db` by id."""
+        sentences = db["sentences"]
+        return [sentences[sid] for sid in self.sentence_ids]
+
+    @sentences.setter
+    def sentences(self, value: List[SentencePair]):
+        self.sentence_ids = array("q", (sp.id for sp in value))
+
+    def to_dict(self, fields: Optional[List[str]] = None) -> Dict:
+        out = {}
+        for name in fields or self.FIELDS:
+            if name == "sentences":
+                out[name] = [sp.to_dict() for sp in self.sentences]
+            else:
+                out[name] = getattr(self, name)
+        return out
+
+
+@dataclass(slots=True)
 class Story:
     id: int
     title: str
@@ -27,17 +233,23 @@ class Story:
     target_locale: str
     metadata: Dict
 
-# In-memory DB
-# db = {
-#     "stories": {},  # story_id -> Story
-#     "studiables": {},  # studiable_id -> Studiable
-#     "sentences": {},  # sentence_id -> SentencePair
-# }
+    FIELDS = ("id", "title", "source_locale", "target_locale", "metadata")
+
+    def __post_init__(self):
+        self.source_locale = sys.intern(self.source_locale)
+        self.target_locale = sys.intern(self.target_locale)
+
+    def to_dict(self, fields: Optional[List[str]] = None) -> Dict:
+        return {name: getattr(self, name) for name in fields or self.FIELDS}
+
 
-db = {'stories': 
-{1: Story(id=1, title='Cats in space', source_locale='en_us', target_locale='es_co', metadata={'language_level': 'A1', 'age_level': '2', 'topic': 'running arrands'})}, 'studiables': {1: Studiable(id=1, story_id=1, title='Chapter 1', raw_text='Leo wakes up. Hello, Leo!\nMama has a big bag.\nWe go out today.\nTime to go to the store.\nWe need some food.\nWe need milk. We need bread.\nSee the big car?\nLeo sits in the car.\nMama drives the car.\nVroom, vroom! We go now.\nHello, big store!Leo se despierta. ¡Hola, Leo!\nMamá tiene una bolsa grande.\nHoy salimos.\nEs hora de ir a la tienda.\nNecesitamos comida.\nNecesitamos leche. Necesitamos pan.\n¿Ves el carro grande?\nLeo se sienta en el carro.\nMamá maneja el carro.\n¡Brum, brum! Ya nos vamos.\n¡Hola, tienda grande!', metadata={'type': 'chapter', 'chapter_number': 1, 'language_level': 'A1', 'age_level': '2', 'topic': 'running arrands', 'conversation_type': 'narrating activities to help toddler acquire language', 'min_sentence_length': 3, 'max_sentence_length': 10}, sentences=[SentencePair(id=1, source_text='Leo wakes up. Hello, Leo!', target_text='Leo se despierta. ¡Hola, Leo!', source_audio='/audio/en_us/en_us_bbcf64896f664e3d.mp3', target_audio='/audio/es_co/es_co_db2725d767342dd6.mp3', order=0), SentencePair(id=2, source_text='Mama has a big bag.', target_text='Mamá tiene una bolsa grande.', source_audio='/audio/en_us/en_us_4217de3553e80006.mp3', target_audio='/audio/es_co/es_co_32cd6f4103c3623c.mp3', order=1), SentencePair(id=3, source_text='We go out today.', target_text='Hoy salimos.', source_audio='/audio/en_us/en_us_f4106bd67478919c.mp3', target_audio='/audio/es_co/es_co_556ba82ba99dcf7b.mp3', order=2), SentencePair(id=4, source_text='Time to go to the store.', target_text='Es hora de ir a la tienda.', source_audio='/audio/en_us/en_us_f32eecb8b8b7ca98.mp3', target_audio='/audio/es_co/es_co_69f09d282aa72d18.mp3', order=3), SentencePair(id=5, source_text='We need some food.', target_text='Necesitamos comida.', source_audio='/audio/en_us/en_us_18029daf631857b5.mp3', target_audio='/audio/es_co/es_co_1c3c2bdd84a7ad1b.mp3', order=4), SentencePair(id=6, source_text='We need milk. We need bread.', target_text='Necesitamos leche. Necesitamos pan.', source_audio='/audio/en_us/en_us_05b6a623d557d7cb.mp3', target_audio='/audio/es_co/es_co_fc995fe84ce3ffb6.mp3', order=5), SentencePair(id=7, source_text='See the big car?', target_text='¿Ves el carro grande?', source_audio='/audio/en_us/en_us_950ede652a745a36.mp3', target_audio='/audio/es_co/es_co_4764eed2c014fa67.mp3', order=6), SentencePair(id=8, source_text='Leo sits in the car.', target_text='Leo se sienta en el carro.', source_audio='/audio/en_us/en_us_6229ed47045849fc.mp3', target_audio='/audio/es_co/es_co_4bdf889fcdf8c836.mp3', order=7), SentencePair(id=9, source_text='Mama drives the car.', target_text='Mamá maneja el carro.', source_audio='/audio/en_us/en_us_6d224dfaea00eef2.mp3', target_audio='/audio/es_co/es_co_5f124f5362536125.mp3', order=8), SentencePair(id=10, source_text='Vroom, vroom! We go now.', target_text='¡Brum, brum! Ya nos vamos.', source_audio='/audio/en_us/en_us_4764981b688c1484.mp3', target_audio='/audio/es_co/es_co_8d1d9a566a49ff74.mp3', order=9), SentencePair(id=11, source_text='Hello, big store!', target_text='¡Hola, tienda grande!', source_audio='/audio/en_us/en_us_782d654356d21351.mp3', target_audio='/audio/es_co/es_co_5b639f6fa67561ce.mp3', order=10)])}, 'sentences': {1: SentencePair(id=1, source_text='Leo wakes up. Hello, Leo!', target_text='Leo se despierta. ¡Hola, Leo!', source_audio='/audio/en_us/en_us_bbcf64896f664e3d.mp3', target_audio='/audio/es_co/es_co_db2725d767342dd6.mp3', order=0), 2: SentencePair(id=2, source_text='Mama has a big bag.', target_text='Mamá tiene una bolsa grande.', source_audio='/audio/en_us/en_us_4217de3553e80006.mp3', target_audio='/audio/es_co/es_co_32cd6f4103c3623c.mp3', order=1), 3: SentencePair(id=3, source_text='We go out today.', target_text='Hoy salimos.', source_audio='/audio/en_us/en_us_f4106bd67478919c.mp3', target_audio='/audio/es_co/es_co_556ba82ba99dcf7b.mp3', order=2), 4: SentencePair(id=4, source_text='Time to go to the store.', target_text='Es hora de ir a la tienda.', source_audio='/audio/en_us/en_us_f32eecb8b8b7ca98.mp3', target_audio='/audio/es_co/es_co_69f09d282aa72d18.mp3', order=3), 5: SentencePair(id=5, source_text='We need some food.', target_text='Necesitamos comida.', source_audio='/audio/en_us/en_us_18029daf631857b5.mp3', target_audio='/audio/es_co/es_co_1c3c2bdd84a7ad1b.mp3', 
-order=4), 6: SentencePair(id=6, source_text='We need milk. We need bread.', target_text='Necesitamos leche. Necesitamos pan.', source_audio='/audio/en_us/en_us_05b6a623d557d7cb.mp3', target_audio='/audio/es_co/es_co_fc995fe84ce3ffb6.mp3', order=5), 7: SentencePair(id=7, source_text='See the big car?', target_text='¿Ves el carro grande?', source_audio='/audio/en_us/en_us_950ede652a745a36.mp3', target_audio='/audio/es_co/es_co_4764eed2c014fa67.mp3', order=6), 8: SentencePair(id=8, source_text='Leo sits in the car.', target_text='Leo se sienta en el carro.', source_audio='/audio/en_us/en_us_6229ed47045849fc.mp3', target_audio='/audio/es_co/es_co_4bdf889fcdf8c836.mp3', order=7), 9: SentencePair(id=9, source_text='Mama drives the car.', target_text='Mamá maneja el carro.', source_audio='/audio/en_us/en_us_6d224dfaea00eef2.mp3', target_audio='/audio/es_co/es_co_5f124f5362536125.mp3', order=8), 10: SentencePair(id=10, source_text='Vroom, vroom! We go now.', target_text='¡Brum, brum! Ya nos vamos.', source_audio='/audio/en_us/en_us_4764981b688c1484.mp3', target_audio='/audio/es_co/es_co_8d1d9a566a49ff74.mp3', order=9), 11: SentencePair(id=11, source_text='Hello, big store!', target_text='¡Hola, tienda grande!', source_audio='/audio/en_us/en_us_782d654356d21351.mp3', target_audio='/audio/es_co/es_co_5b639f6fa67561ce.mp3', order=10)}}
+# In-memory DB, filled at startup from storage (or the seed snapshot, src/seed.jsonl)
+db = {
+    "stories": {},  # story_id -> Story
+    "studiables": {},  # studiable_id -> Studiable
+    "sentences": SentenceStore(),  # sentence_id -> SentencePair
+}
 
 def reset_db():
     for key in db:
-        db[key].clear()
\ No newline at end of file
+        db[key].clear()
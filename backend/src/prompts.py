@@ -1,6 +1,20 @@
 """
 Gemini prompt templates for story chapter and quiz generation.
 """
+import json
+
+# Response schema for fused story + translation generation
+SENTENCE_PAIRS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "source": {"type": "string"},
+            "target": {"type": "string"},
+        },
+        "required": ["source", "target"],
+    },
+}
 
 def build_title_prompt(
     topic: str,
@@ -89,6 +103,61 @@ INPUT STORY:
     return prompt
     
 
+def build_aligned_output_instructions(
+    source_locale: str,
+    target_locale: str,
+) -> str:
+    """
+    Build instructions that turn a chapter prompt into a fused story + translation prompt.
+    
+    Appended to `build_new_story_prompt` or `build_next_chapter_prompt` output;
+    the response is a JSON array of aligned sentence pairs (SENTENCE_PAIRS_SCHEMA).
+    """
+    
+    return f"""
+TRANSLATION AND OUTPUT FORMAT (overrides the output format above):
+- Write each sentence of the chapter in {source_locale}
+- Translate each sentence into {target_locale}
+- Return a JSON array with one object per sentence, in story order
+- Each object has "source" (the {source_locale} sentence) and "target" (its {target_locale} translation)
+- Never split or merge sentences between "source" and "target"
+"""
+
+
+def parse_sentence_pairs(response_text: str) -> list:
+    """
+    Parse and validate a fused generation response.
+    
+    Returns a list of (source, target) tuples. Raises ValueError if the
+    response is not a JSON array of objects with non-empty "source" and
+    "target" strings.
+    """
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {e}") from e
+    
+    if not isinstance(data, list) or not data:
+        raise ValueError("Response must be a non-empty JSON array")
+    
+    pairs = []
+    for i, item in enumerate(data):
+        if not isinstance(item, dict):
+            raise ValueError(f"Item {i} is not an object")
+        src = item.get("source")
+        tgt = item.get("target")
+        if not isinstance(src, str) or not isinstance(tgt, str):
+            raise ValueError(f"Item {i} is missing a source or target string")
+        src, tgt = src.strip(), tgt.strip()
+        if not src or not tgt:
+            raise ValueError(f"Item {i} has an empty source or target")
+        if "\n" in src or "\n" in tgt:
+            raise ValueError(f"Item {i} spans more than one line")
+        pairs.append((src, tgt))
+    
+    return pairs
+
+
 def build_new_story_prompt(
     title: str,
     source_locale: str,
@@ -210,6 +279,43 @@ Create the next chapter that continues the narrative and helps the learner pract
     return prompt
 
 
+def build_summary_prompt(
+    previous_summary: str,
+    chapter_sentences: list,
+    max_words: int
+) -> str:
+    """
+    Build a prompt for folding a finished chapter into a story's rolling summary.
+    
+    Returns a prompt that instructs Gemini to rewrite the summary so it also
+    covers the new chapter, staying under `max_words`.
+    """
+    
+    chapter_text = "\n".join(chapter_sentences)
+    previous = previous_summary.strip() or "(This is the first chapter.)"
+    
+    prompt = f"""Update the summary of a story so it also covers its newest chapter.
+
+CURRENT SUMMARY:
+{previous}
+
+NEW CHAPTER:
+{chapter_text}
+
+REQUIREMENTS:
+- At most {max_words} words
+- Write in the same language as the chapter
+- Keep the characters, their names, places and important objects
+- Keep unresolved events and where the story currently stands
+- Drop minor details from older chapters first
+
+OUTPUT:
+Provide ONLY the updated summary text, nothing else.
+"""
+    
+    return prompt
+
+
 def build_quiz_prompt(
     chapter_sentences: list,
     target_locale: str,
@@ -0,0 +1,38 @@
+"""
+Error classification and backoff shared by the Gemini and TTS callers.
+"""
+import asyncio
+import random
+from typing import Optional
+
+THROTTLE = "throttle"
+DEADLINE = "deadline"
+TRANSIENT = "transient"
+
+
+def classify_error(e: BaseException) -> Optional[str]:
+    """
+    THROTTLE, DEADLINE or TRANSIENT for errors worth retrying, else None.
+
+    Google API errors carry the HTTP status as `code`; gRPC-level errors are
+    recognised by class name, so this works without google.api_core.
+    """
+    code = getattr(e, "code", None)
+    if not isinstance(code, int):
+        code = None
+    name = type(e).__name__
+    if code in (429, 503) or name in ("ResourceExhausted", "TooManyRequests",
+                                      "ServiceUnavailable") or "quota" in str(e).lower():
+        return THROTTLE
+    if code == 504 or name == "DeadlineExceeded" or isinstance(e, (TimeoutError,
+                                                                     asyncio.TimeoutError)):
+        return DEADLINE
+    if code in (500, 502) or name in ("InternalServerError", "BadGateway") \
+            or isinstance(e, ConnectionError):
+        return TRANSIENT
+    return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,139 @@
+"""
+Snapshot export and import.
+
+A snapshot is a JSON Lines file (gzip-compressed when the name ends in .gz):
+a header line, then one compact record per line, with all stories first,
+then all studiables, then all sentences. Both directions stream record by
+record, so memory use does not depend on the size of the corpus.
+
+    python -m src.snapshot export corpus.jsonl.gz
+    python -m src.snapshot import corpus.jsonl.gz
+
+The commands work on the SQLite database at APRENDIA_DB_PATH (or --db).
+The seed data loaded into an empty database is a snapshot as well.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Iterator, Tuple
+
+from src.models import SentencePair, Story, Studiable
+
+SNAPSHOT_FORMAT = "aprendia-snapshot"
+SNAPSHOT_VERSION = 1
+
+Record = Tuple[str, Dict]  # (kind, fields); kind is story, studiable or sentence
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", compresslevel=6, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_snapshot(path: str, records: Iterable[Record]) -> Dict[str, int]:
+    """Write `records` to `path`; returns the number written per kind."""
+    counts = {"story": 0, "studiable": 0, "sentence": 0}
+    with _open(path, "w") as f:
+        header = {"kind": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION}
+        f.write(json.dumps(header, separators=(",", ":")) + "\n")
+        for kind, fields in records:
+            f.write(json.dumps({"kind": kind, **fields}, ensure_ascii=False,
+                               separators=(",", ":")) + "\n")
+            counts[kind] += 1
+    return counts
+
+
+def read_snapshot(path: str) -> Iterator[Record]:
+    """Yield the records of the snapshot at `path`, one at a time."""
+    with _open(path, "r") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("kind") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not an Aprendia snapshot")
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {header.get('version')}")
+        for line in f:
+            if line.strip():
+                fields = json.loads(line)
+                yield fields.pop("kind"), fields
+
+
+def db_records(db: Dict) -> Iterator[Record]:
+    """Records for everything in an in-memory `db` dict, in snapshot order."""
+    for story in db["stories"].values():
+        yield "story", {
+            "id": story.id,
+            "title": story.title,
+            "source_locale": story.source_locale,
+            "target_locale": story.target_locale,
+            "metadata": story.metadata,
+        }
+    for studiable in db["studiables"].values():
+        yield "studiable", {
+            "id": studiable.id,
+            "story_id": studiable.story_id,
+            "title": studiable.title,
+            "raw_text": studiable.raw_text,
+            "metadata": studiable.metadata,
+        }
+    for studiable in db["studiables"].values():
+        for sp in studiable.sentences:
+            yield "sentence", {
+                "id": sp.id,
+                "studiable_id": studiable.id,
+                "source_text": sp.source_text,
+                "target_text": sp.target_text,
+                "source_audio": sp.source_audio,
+                "target_audio": sp.target_audio,
+                "order": sp.order,
+            }
+
+
+def load_records(records: Iterable[Record], db: Dict):
+    """Add snapshot records to an in-memory `db` dict."""
+    for kind, fields in records:
+        if kind == "story":
+            db["stories"][fields["id"]] = Story(**fields)
+        elif kind == "studiable":
+            db["studiables"][fields["id"]] = Studiable(**fields)
+        elif kind == "sentence":
+            studiable_id = fields.pop("studiable_id")
+            sp = SentencePair(**fields)
+            db["sentences"][sp.id] = sp
+            db["studiables"][studiable_id].sentence_ids.append(sp.id)
+        else:
+            raise ValueError(f"Unknown snapshot record kind: {kind}")
+
+
+def main(argv=None):
+    from src.storage import DB_PATH, SQLiteStorage
+
+    parser = argparse.ArgumentParser(description="Export or import an Aprendia snapshot.")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="snapshot file (.jsonl or .jsonl.gz)")
+    parser.add_argument("--db", default=DB_PATH, help=f"SQLite database (default: {DB_PATH})")
+    args = parser.parse_args(argv)
+    if args.command == "export" and not os.path.exists(args.db):
+        parser.error(f"database not found: {args.db}")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    storage = SQLiteStorage(args.db)
+    start = time.perf_counter()
+    try:
+        if args.command == "export":
+            counts = write_snapshot(args.path, storage.iter_records())
+        else:
+            counts = storage.import_records(read_snapshot(args.path))
+    finally:
+        storage.close()
+    logging.info(
+        f"{args.command}: {counts['story']} stories, {counts['studiable']} studiables, "
+        f"{counts['sentence']} sentences in {time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
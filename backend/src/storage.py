@@ -0,0 +1,581 @@
+"""
+Durable storage backends for stories, studiables and sentence pairs.
+
+The module-level `db` dict in `src.models` stays the working set that the API
+reads from. A storage backend loads it once at startup and persists changes
+as they happen, so a restart does not lose generated content.
+
+The SQLite backend is also what lets several worker processes share state:
+IDs come from sequences in the database, and every save is recorded in a
+change log that other processes replay into their own `db` (see `sync`).
+"""
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from dataclasses import fields
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src import models
+from src.models import Story, Studiable, SentencePair
+from src.snapshot import Record, db_records, load_records, read_snapshot
+
+STORAGE_BACKEND = os.getenv("APRENDIA_STORAGE", "sqlite")
+DB_PATH = os.getenv("APRENDIA_DB_PATH", "./aprendia.db")
+# Snapshot loaded into an empty database; set to "" to start empty
+SEED_PATH = os.getenv(
+    "APRENDIA_SEED_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed.jsonl")
+)
+# Rows per transaction when importing snapshots
+IMPORT_BATCH_SIZE = 5000
+
+
+def seed_records() -> Iterator[Record]:
+    if SEED_PATH and os.path.exists(SEED_PATH):
+        yield from read_snapshot(SEED_PATH)
+
+
+SEQUENCES = ("stories", "studiables", "sentences")
+
+
+def _chapter_sequence(story_id: int) -> str:
+    """Name of the sequence that numbers a story's chapters."""
+    return f"chapters:{story_id}"
+
+
+def _assign(target, source):
+    """Copy every field of the dataclass `source` onto `target`."""
+    for f in fields(source):
+        setattr(target, f.name, getattr(source, f.name))
+
+
+class Storage:
+    """
+    Base storage interface. The default implementation keeps state only in
+    the `db` dict it was loaded into, so nothing survives a restart.
+    """
+
+    def __init__(self):
+        self._sequences: Dict[str, int] = {}
+        self._sequence_lock = threading.Lock()
+        self._db: Optional[Dict] = None
+
+    def load_into(self, db: Dict):
+        """Populate `db` from the backend and continue ID allocation after it."""
+        self._db = db
+        if not db["stories"]:
+            load_records(seed_records(), db)
+        self._advance_sequences(db)
+
+    def _advance_sequences(self, db: Dict):
+        """Move every sequence past the ids and chapter numbers already in `db`."""
+        values = {name: max(db[name], default=0) for name in SEQUENCES}
+        for studiable in db["studiables"].values():
+            if studiable.metadata.get("type") == "chapter":
+                name = _chapter_sequence(studiable.story_id)
+                values[name] = values.get(name, 0) + 1
+        with self._sequence_lock:
+            for name, value in values.items():
+                self._sequences[name] = max(self._sequences.get(name, 0), value)
+
+    def allocate_ids(self, name: str, count: int = 1) -> range:
+        """Reserve `count` consecutive ids from sequence `name` (stories, studiables, sentences)."""
+        with self._sequence_lock:
+            start = self._sequences.get(name, 0) + 1
+            self._sequences[name] = start + count - 1
+        return range(start, start + count)
+
+    def add_chapter(self, story_id: int, build: Callable[[int], Studiable]) -> Studiable:
+        """
+        Persist a new chapter of `story_id`, numbered after the existing ones.
+
+        `build(number)` returns the studiable for the allocated chapter number.
+        """
+        studiable = build(self.allocate_ids(_chapter_sequence(story_id))[0])
+        self.save_studiable(studiable)
+        return studiable
+
+    def sync(self, db: Dict) -> List[Tuple[str, object, Optional[object]]]:
+        """
+        Apply changes saved by other processes to `db`.
+
+        Returns (kind, record, previous) for each story or studiable that was
+        added or replaced, where `previous` is a copy of the record as it was
+        before (None if it is new). Backends that are not shared return nothing.
+
+        Sentences that a replaced studiable no longer references stay in `db`;
+        the caller drops them once nothing reads the previous ids any more.
+        """
+        return []
+
+    def iter_records(self) -> Iterator[Record]:
+        """Stream everything stored as snapshot records (see `src.snapshot`)."""
+        return db_records(self._db) if self._db is not None else iter(())
+
+    def import_records(self, records: Iterable[Record]) -> Dict[str, int]:
+        """Store snapshot records, replacing existing ones with the same ids."""
+        db = self._db if self._db is not None else models.db
+        counts = {"story": 0, "studiable": 0, "sentence": 0}
+
+        def counted():
+            for kind, fields in records:
+                if kind == "studiable" and fields["id"] in db["studiables"]:
+                    # The snapshot brings the replaced studiable's sentences
+                    for sid in db["studiables"][fields["id"]].sentence_ids:
+                        db["sentences"].pop(sid, None)
+                if kind in counts:
+                    counts[kind] += 1
+                yield kind, fields
+
+        load_records(counted(), db)
+        self._advance_sequences(db)
+        return counts
+
+    def save_story(self, story: Story):
+        """Persist a story."""
+
+    def save_studiable(self, studiable: Studiable):
+        """Persist a studiable together with all of its sentences."""
+
+    def close(self):
+        """Release any resources held by the backend."""
+
+
+class MemoryStorage(Storage):
+    """Keeps state in the `db` dict only; everything is lost on restart."""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    source_locale TEXT NOT NULL,
+    target_locale TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS studiables (
+    id INTEGER PRIMARY KEY,
+    story_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    raw_text TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sentences (
+    id INTEGER PRIMARY KEY,
+    studiable_id INTEGER NOT NULL,
+    source_text TEXT NOT NULL,
+    target_text TEXT NOT NULL,
+    source_audio TEXT NOT NULL,
+    target_audio TEXT NOT NULL,
+    ord INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_studiables_story ON studiables(story_id);
+CREATE INDEX IF NOT EXISTS idx_sentences_studiable ON sentences(studiable_id, ord);
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    origin TEXT NOT NULL
+);
+"""
+
+# Change log entries kept at startup; a process that falls further behind
+# than this would miss changes, so keep it far above the sync interval's volume
+CHANGES_KEPT = 100000
+
+
+class SQLiteStorage(Storage):
+    """
+    Embedded SQLite backend in WAL mode.
+
+    The connection is opened on first use. A studiable and its sentences are
+    written in a single transaction, so a finished chapter costs one commit.
+    Safe to share between processes (e.g. `uvicorn --workers N`).
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        super().__init__()
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Identifies this process's entries in the change log
+        self.origin = uuid.uuid4().hex
+        self._last_change = 0
+        self._data_version = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def load_into(self, db: Dict):
+        with self._lock:
+            conn = self._connect()
+            (count,) = conn.execute("SELECT COUNT(*) FROM stories").fetchone()
+            if count == 0:
+                # Fresh database: start from the seed snapshot
+                self._import(conn, seed_records())
+            self._read_all(conn, db)
+            self._init_sequences(conn)
+
+            (self._last_change,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM changes"
+            ).fetchone()
+            with conn:
+                conn.execute("DELETE FROM changes WHERE seq <= ?",
+                             (self._last_change - CHANGES_KEPT,))
+            (self._data_version,) = conn.execute("PRAGMA data_version").fetchone()
+
+        logging.info(
+            f"Loaded {len(db['stories'])} stories, {len(db['studiables'])} studiables, "
+            f"{len(db['sentences'])} sentences from {self.path}"
+        )
+
+    @staticmethod
+    def _story_from_row(row) -> Story:
+        return Story(
+            id=row[0],
+            title=row[1],
+            source_locale=row[2],
+            target_locale=row[3],
+            metadata=json.loads(row[4]),
+        )
+
+    @staticmethod
+    def _studiable_from_row(row) -> Studiable:
+        return Studiable(
+            id=row[0],
+            story_id=row[1],
+            title=row[2],
+            raw_text=row[3],
+            metadata=json.loads(row[4]),
+        )
+
+    @staticmethod
+    def _sentence_from_row(row) -> SentencePair:
+        return SentencePair(
+            id=row[0],
+            source_text=row[2],
+            target_text=row[3],
+            source_audio=row[4],
+            target_audio=row[5],
+            order=row[6],
+        )
+
+    def _read_all(self, conn: sqlite3.Connection, db: Dict):
+        for key in db:
+            db[key].clear()
+
+        for row in conn.execute(
+            "SELECT id, title, source_locale, target_locale, metadata FROM stories"
+        ):
+            db["stories"][row[0]] = self._story_from_row(row)
+
+        for row in conn.execute(
+            "SELECT id, story_id, title, raw_text, metadata FROM studiables"
+        ):
+            db["studiables"][row[0]] = self._studiable_from_row(row)
+
+        for row in conn.execute(
+            "SELECT id, studiable_id, source_text, target_text, source_audio, "
+            "target_audio, ord FROM sentences ORDER BY studiable_id, ord"
+        ):
+            sp = self._sentence_from_row(row)
+            db["sentences"][sp.id] = sp
+            studiable = db["studiables"].get(row[1])
+            if studiable is not None:
+                studiable.sentence_ids.append(sp.id)
+
+    def _init_sequences(self, conn: sqlite3.Connection):
+        """Make sure every sequence exists and is past the highest stored id."""
+        with conn:
+            for name in SEQUENCES:
+                conn.execute(
+                    "INSERT OR IGNORE INTO sequences (name, value) VALUES (?, 0)", (name,)
+                )
+                conn.execute(
+                    f"UPDATE sequences SET value = MAX(value, "
+                    f"(SELECT COALESCE(MAX(id), 0) FROM {name})) WHERE name = ?",
+                    (name,),
+                )
+
+    def allocate_ids(self, name: str, count: int = 1) -> range:
+        with self._lock:
+            conn = self._connect()
+            # The UPDATE takes the database write lock, so concurrent
+            # processes always get disjoint ranges
+            with conn:
+                conn.execute(
+                    "UPDATE sequences SET value = value + ? WHERE name = ?", (count, name)
+                )
+                (end,) = conn.execute(
+                    "SELECT value FROM sequences WHERE name = ?", (name,)
+                ).fetchone()
+        return range(end - count + 1, end + 1)
+
+    def add_chapter(self, story_id: int, build: Callable[[int], Studiable]) -> Studiable:
+        name = _chapter_sequence(story_id)
+        with self._lock:
+            conn = self._connect()
+            # Number and insert in one write transaction, so processes adding
+            # chapters to the same story at once get distinct numbers
+            with conn:
+                # Stories from before the sequence existed start at their chapter count
+                conn.execute(
+                    "INSERT OR IGNORE INTO sequences (name, value) SELECT ?, COUNT(*) "
+                    "FROM studiables WHERE story_id = ? "
+                    "AND json_extract(metadata, '$.type') = 'chapter'",
+                    (name, story_id),
+                )
+                conn.execute("UPDATE sequences SET value = value + 1 WHERE name = ?", (name,))
+                (number,) = conn.execute(
+                    "SELECT value FROM sequences WHERE name = ?", (name,)
+                ).fetchone()
+                studiable = build(number)
+                self._upsert_studiable(conn, studiable)
+        return studiable
+
+    def sync(self, db: Dict) -> List[Tuple[str, object, Optional[object]]]:
+        with self._lock:
+            conn = self._connect()
+            # data_version only changes when another connection commits
+            (data_version,) = conn.execute("PRAGMA data_version").fetchone()
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+
+            rows = conn.execute(
+                "SELECT seq, kind, item_id, origin FROM changes WHERE seq > ? ORDER BY seq",
+                (self._last_change,),
+            ).fetchall()
+            if not rows:
+                return []
+            self._last_change = rows[-1][0]
+            changed = list(dict.fromkeys(
+                (kind, item_id) for _, kind, item_id, origin in rows if origin != self.origin
+            ))
+            return [self._reload(conn, db, kind, item_id) for kind, item_id in changed]
+
+    def _reload(self, conn: sqlite3.Connection, db: Dict, kind: str, item_id: int):
+        """
+        Replace one record in `db` with its stored version.
+
+        Existing objects are updated in place, so references held by running
+        requests and jobs stay valid; a studiable's sentence ids are swapped
+        in a single assignment.
+        """
+        if kind == "story":
+            row = conn.execute(
+                "SELECT id, title, source_locale, target_locale, metadata FROM stories "
+                "WHERE id = ?", (item_id,)
+            ).fetchone()
+            story = self._story_from_row(row)
+            existing = db["stories"].get(item_id)
+            if existing is None:
+                db["stories"][item_id] = story
+                return kind, story, None
+            previous = copy.copy(existing)
+            _assign(existing, story)
+            return kind, existing, previous
+
+        row = conn.execute(
+            "SELECT id, story_id, title, raw_text, metadata FROM studiables WHERE id = ?",
+            (item_id,),
+        ).fetchone()
+        studiable = self._studiable_from_row(row)
+        sentences = [
+            self._sentence_from_row(r) for r in conn.execute(
+                "SELECT id, studiable_id, source_text, target_text, source_audio, "
+                "target_audio, ord FROM sentences WHERE studiable_id = ? ORDER BY ord",
+                (item_id,),
+            )
+        ]
+        studiable.sentences = sentences
+        # New rows go in before the studiable points at them, so concurrent
+        # readers always find every sentence it references
+        for sp in sentences:
+            db["sentences"][sp.id] = sp
+        existing = db["studiables"].get(item_id)
+        if existing is None:
+            db["studiables"][item_id] = studiable
+            return kind, studiable, None
+        previous = copy.copy(existing)
+        _assign(existing, studiable)
+        return kind, existing, previous
+
+    def iter_records(self) -> Iterator[Record]:
+        with self._lock:
+            conn = self._connect()
+            for row in conn.execute(
+                "SELECT id, title, source_locale, target_locale, metadata FROM stories "
+                "ORDER BY id"
+            ):
+                yield "story", {
+                    "id": row[0], "title": row[1], "source_locale": row[2],
+                    "target_locale": row[3], "metadata": json.loads(row[4]),
+                }
+            for row in conn.execute(
+                "SELECT id, story_id, title, raw_text, metadata FROM studiables ORDER BY id"
+            ):
+                yield "studiable", {
+                    "id": row[0], "story_id": row[1], "title": row[2], "raw_text": row[3],
+                    "metadata": json.loads(row[4]),
+                }
+            for row in conn.execute(
+                "SELECT id, studiable_id, source_text, target_text, source_audio, "
+                "target_audio, ord FROM sentences ORDER BY studiable_id, ord"
+            ):
+                yield "sentence", {
+                    "id": row[0], "studiable_id": row[1], "source_text": row[2],
+                    "target_text": row[3], "source_audio": row[4], "target_audio": row[5],
+                    "order": row[6],
+                }
+
+    def import_records(self, records: Iterable[Record]) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connect()
+            counts = self._import(conn, records)
+            self._init_sequences(conn)
+        return counts
+
+    def _import(self, conn: sqlite3.Connection, records: Iterable[Record]) -> Dict[str, int]:
+        """
+        Bulk-insert snapshot records, committing every IMPORT_BATCH_SIZE rows.
+
+        Only one batch is held in memory. Stories and studiables go into the
+        change log so running workers pick them up.
+        """
+        counts = {"story": 0, "studiable": 0, "sentence": 0}
+        batches = {"story": [], "studiable": [], "sentence": []}
+
+        def flush():
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO stories (id, title, source_locale, target_locale, "
+                    "metadata) VALUES (?, ?, ?, ?, ?)", batches["story"],
+                )
+                # A replaced studiable loses its old sentences; the snapshot's follow later
+                conn.executemany(
+                    "DELETE FROM sentences WHERE studiable_id = ?",
+                    [(row[0],) for row in batches["studiable"]],
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO studiables (id, story_id, title, raw_text, metadata) "
+                    "VALUES (?, ?, ?, ?, ?)", batches["studiable"],
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sentences (id, studiable_id, source_text, "
+                    "target_text, source_audio, target_audio, ord) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    batches["sentence"],
+                )
+                conn.executemany(
+                    "INSERT INTO changes (kind, item_id, origin) VALUES (?, ?, ?)",
+                    [("story", row[0], self.origin) for row in batches["story"]]
+                    + [("studiable", studiable_id, self.origin) for studiable_id in dict.fromkeys(
+                        [row[0] for row in batches["studiable"]]
+                        + [row[1] for row in batches["sentence"]]
+                    )],
+                )
+            for batch in batches.values():
+                batch.clear()
+
+        pending = 0
+        for kind, r in records:
+            if kind == "story":
+                row = (r["id"], r["title"], r["source_locale"], r["target_locale"],
+                       json.dumps(r["metadata"]))
+            elif kind == "studiable":
+                row = (r["id"], r["story_id"], r["title"], r["raw_text"],
+                       json.dumps(r["metadata"]))
+            elif kind == "sentence":
+                row = (r["id"], r["studiable_id"], r["source_text"], r["target_text"],
+                       r["source_audio"], r["target_audio"], r["order"])
+            else:
+                raise ValueError(f"Unknown snapshot record kind: {kind}")
+            batches[kind].append(row)
+            counts[kind] += 1
+            pending += 1
+            if pending >= IMPORT_BATCH_SIZE:
+                flush()
+                pending = 0
+        flush()
+        return counts
+
+    def _upsert_story(self, conn: sqlite3.Connection, story: Story):
+        conn.execute(
+            "INSERT OR REPLACE INTO stories (id, title, source_locale, target_locale, metadata) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (story.id, story.title, story.source_locale, story.target_locale,
+             json.dumps(story.metadata)),
+        )
+        self._log_change(conn, "story", story.id)
+
+    def _log_change(self, conn: sqlite3.Connection, kind: str, item_id: int):
+        conn.execute(
+            "INSERT INTO changes (kind, item_id, origin) VALUES (?, ?, ?)",
+            (kind, item_id, self.origin),
+        )
+
+    def _upsert_studiable(self, conn: sqlite3.Connection, studiable: Studiable):
+        conn.execute(
+            "INSERT OR REPLACE INTO studiables (id, story_id, title, raw_text, metadata) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (studiable.id, studiable.story_id, studiable.title, studiable.raw_text,
+             json.dumps(studiable.metadata)),
+        )
+        conn.execute("DELETE FROM sentences WHERE studiable_id = ?", (studiable.id,))
+        conn.executemany(
+            "INSERT INTO sentences (id, studiable_id, source_text, target_text, source_audio, "
+            "target_audio, ord) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (sp.id, studiable.id, sp.source_text, sp.target_text, sp.source_audio,
+                 sp.target_audio, sp.order)
+                for sp in studiable.sentences
+            ],
+        )
+        self._log_change(conn, "studiable", studiable.id)
+
+    def save_story(self, story: Story):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._upsert_story(conn, story)
+
+    def save_studiable(self, studiable: Studiable):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._upsert_studiable(conn, studiable)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_storage: Optional[Storage] = None
+
+
+def get_storage() -> Storage:
+    """Return the process-wide storage backend selected by APRENDIA_STORAGE."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            _storage = SQLiteStorage(DB_PATH)
+        elif STORAGE_BACKEND == "memory":
+            _storage = MemoryStorage()
+        else:
+            raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+    return _storage
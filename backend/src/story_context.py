@@ -0,0 +1,65 @@
+"""
+Bounded story context for chapter continuation prompts.
+
+Instead of the full text of every earlier chapter, a continuation prompt gets
+a rolling summary of the story plus its most recent sentences, trimmed to a
+fixed token budget, so prompt size does not grow with the chapter count.
+"""
+import os
+from typing import List
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("APRENDIA_CONTEXT_TOKEN_BUDGET", "800"))
+CONTEXT_RECENT_SENTENCES = int(os.getenv("APRENDIA_CONTEXT_RECENT_SENTENCES", "12"))
+SUMMARY_MAX_WORDS = int(os.getenv("APRENDIA_SUMMARY_MAX_WORDS", "150"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token); good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def _truncate_words(text: str, max_tokens: int) -> str:
+    words = text.split()
+    kept = []
+    used = 0
+    for word in words:
+        used += estimate_tokens(word + " ")
+        if used > max_tokens:
+            break
+        kept.append(word)
+    return " ".join(kept)
+
+
+def build_story_context(
+    summary: str,
+    recent_sentences: List[str],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_recent: int = CONTEXT_RECENT_SENTENCES,
+) -> str:
+    """
+    Combine the rolling summary and the latest sentences into prompt context.
+
+    The summary may use at most half the budget; the rest goes to the most
+    recent sentences, newest first, so the story continues from where it
+    actually left off.
+    """
+    parts = []
+    used = 0
+    summary = summary.strip()
+    if summary:
+        if estimate_tokens(summary) > token_budget // 2:
+            summary = _truncate_words(summary, token_budget // 2)
+        parts.append(f"Summary so far:\n{summary}")
+        used += estimate_tokens(summary)
+
+    recent = []
+    for sentence in reversed(recent_sentences[-max_recent:] if max_recent > 0 else []):
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > token_budget:
+            break
+        recent.append(sentence)
+        used += cost
+    if recent:
+        parts.append("Last sentences:\n" + "\n".join(reversed(recent)))
+
+    return "\n\n".join(parts)
@@ -1,34 +1,288 @@
 import hashlib, os
+import asyncio
+import contextvars
+import functools
+import logging
+import re
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.tts_limiter import TTS_MAX_CONCURRENCY
 
 AUDIO_BASE = "./static_audio"
+# Files live in two levels of hash-prefix directories, e.g.
+# static_audio/en_us/bb/cf/en_us_bbcf64896f664e3d.mp3, so no directory grows
+# past a few thousand entries. URLs stay flat: /audio/en_us/en_us_bbcf64896f664e3d.mp3
+_HASH_FNAME = re.compile(r"_([0-9a-f]{16})\.(mp3|ogg)$")
+_LOCALE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@dataclass(frozen=True)
+class AudioProfile:
+    name: str
+    encoding: str  # texttospeech.AudioEncoding member
+    extension: str
+    media_type: str
+    sample_rate_hertz: int = 0  # 0 keeps the voice's native rate
+    accept: Tuple[str, ...] = ()  # Accept header types that select this profile
+
+
+AUDIO_PROFILES = {
+    "mp3": AudioProfile("mp3", "MP3", "mp3", "audio/mpeg", accept=("audio/mpeg", "audio/mp3")),
+    # Speech-only Opus at 16 kHz is a fraction of the MP3 size; meant for mobile
+    "opus": AudioProfile("opus", "OGG_OPUS", "ogg", "audio/ogg", 16000,
+                         accept=("audio/ogg", "audio/opus", "application/ogg")),
+}
+# Stored sentence URLs and bundles use MP3; other profiles are variants of it
+CANONICAL_PROFILE = "mp3"
+# Profiles generated for every sentence, e.g. "mp3,opus"; override per locale
+# with APRENDIA_AUDIO_PROFILES_<LOCALE> (e.g. APRENDIA_AUDIO_PROFILES_ES_CO)
+AUDIO_PROFILES_DEFAULT = os.getenv("APRENDIA_AUDIO_PROFILES", CANONICAL_PROFILE)
+
+# Content-addressed cache bookkeeping: one in-flight synthesis per audio file
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+tts_cache_stats = {"hits": 0, "misses": 0, "deduped": 0}
 
 def text_hash_filename(locale: str, text: str) -> str:
     h = hashlib.sha256((locale + text).encode()).hexdigest()[:16]
     return f"{locale}_{h}.mp3"
 
-def ensure_audio_path(locale: str):
-    p = Path(AUDIO_BASE) / locale
+def variant_fname(fname: str, profile: str) -> str:
+    """
+    Name of the `profile` encoding of the audio whose MP3 file is `fname`.
+
+    The profile is hashed into the name, so each encoding is its own
+    immutable file, and the server can find a variant from the MP3 URL alone.
+    """
+    if profile == CANONICAL_PROFILE:
+        return fname
+    stem, _, _ = fname.rpartition(".")
+    locale, _, h = stem.rpartition("_")
+    vh = hashlib.sha256(f"{h}:{profile}".encode()).hexdigest()[:16]
+    return f"{locale}_{vh}.{AUDIO_PROFILES[profile].extension}"
+
+def profiles_for(locale: str) -> List[str]:
+    """Profiles to generate for `locale`, MP3 first."""
+    value = os.getenv(f"APRENDIA_AUDIO_PROFILES_{locale.upper()}", AUDIO_PROFILES_DEFAULT)
+    names = [name.strip() for name in value.split(",")]
+    return [CANONICAL_PROFILE] + [
+        name for name in dict.fromkeys(names) if name in AUDIO_PROFILES and name != CANONICAL_PROFILE
+    ]
+
+def negotiate_profiles(accept: Optional[str]) -> List[str]:
+    """Profiles the client explicitly accepts, best first. Wildcards select nothing."""
+    ranked = []
+    for i, part in enumerate((accept or "").split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        for profile in AUDIO_PROFILES.values():
+            if q > 0 and media_type.lower() in profile.accept:
+                ranked.append((-q, i, profile.name))
+    return list(dict.fromkeys(name for _, _, name in sorted(ranked)))
+
+def audio_fname_hash(locale: str, fname: str) -> Optional[str]:
+    """The content hash in an audio file name, or None if it isn't one of ours."""
+    if not _LOCALE.match(locale) or not fname.startswith(f"{locale}_"):
+        return None
+    m = _HASH_FNAME.search(fname)
+    if m is None or m.start() != len(locale):
+        return None
+    return m.group(1)
+
+def audio_shard_dir(locale: str, audio_hash: str, base: str = AUDIO_BASE) -> Path:
+    return Path(base) / locale / audio_hash[:2] / audio_hash[2:4]
+
+def ensure_audio_path(locale: str, fname: str):
+    p = audio_shard_dir(locale, audio_fname_hash(locale, fname))
     p.mkdir(parents=True, exist_ok=True)
     return p
 
+def find_audio_file(locale: str, fname: str) -> Optional[Path]:
+    """Path of an existing audio file, checking the sharded layout then the old flat one."""
+    audio_hash = audio_fname_hash(locale, fname)
+    if audio_hash is None:
+        return None
+    for fpath in (audio_shard_dir(locale, audio_hash) / fname, Path(AUDIO_BASE) / locale / fname):
+        if fpath.is_file():
+            return fpath
+    return None
+
+def find_audio_url(url: str) -> Optional[Path]:
+    """Path of the existing file behind an /audio/<locale>/<fname> URL."""
+    parts = url.split("/")
+    if len(parts) != 4 or parts[:2] != ["", "audio"]:
+        return None
+    return find_audio_file(parts[2], parts[3])
+
 def get_audio_fname(locale: str, text: str) -> str:
-    p = ensure_audio_path(locale)
     fname = text_hash_filename(locale, text)
     return f"/audio/{locale}/{fname}"
 
-def get_audio_write_fname(locale: str, text: str) -> str:
-    p = ensure_audio_path(locale)
-    fname = text_hash_filename(locale, text)
-    fpath = p / fname
+def get_audio_write_fname(locale: str, text: str, profile: str = CANONICAL_PROFILE) -> str:
+    fname = variant_fname(text_hash_filename(locale, text), profile)
+    fpath = ensure_audio_path(locale, fname) / fname
     return fpath
 
 
-def save_audio_bytes(locale: str, text: str, audio_bytes: bytes) -> str:
-    p = ensure_audio_path(locale)
-    fname = text_hash_filename(locale, text)
-    fpath = p / fname
-    with open(fpath, "wb") as f:
-        f.write(audio_bytes)
-    # Return URL path instead of file path
-    
+def migrate_audio_layout(base: str = AUDIO_BASE) -> int:
+    """
+    Move audio files from the old flat static_audio/<locale>/ layout into
+    hash-prefix shards. Safe to run repeatedly, and from several worker
+    processes at once; returns the number this call moved.
+    """
+    base = Path(base)
+    if not base.is_dir():
+        return 0
+    moved = 0
+    for locale_dir in base.iterdir():
+        if not locale_dir.is_dir():
+            continue
+        locale = locale_dir.name
+        with os.scandir(locale_dir) as entries:
+            flat = [e for e in entries if e.is_file() and audio_fname_hash(locale, e.name)]
+        for entry in flat:
+            target = audio_shard_dir(locale, audio_fname_hash(locale, entry.name), base)
+            target.mkdir(parents=True, exist_ok=True)
+            try:
+                # Files are content-addressed, so replacing an existing target is harmless
+                os.replace(entry.path, target / entry.name)
+            except FileNotFoundError:
+                continue  # another worker moved it first
+            moved += 1
+    if moved:
+        logging.info(f"Moved {moved} audio files into the sharded layout under {base}")
+    return moved
+
+
+def write_audio_atomic(fpath, audio_bytes: bytes):
+    """Write through a temp file and rename, so readers never see partial audio."""
+    fpath = Path(fpath)
+    tmp = fpath.with_name(f".{fpath.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(audio_bytes)
+        os.replace(tmp, fpath)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _claim(fpath) -> tuple:
+    """Return (future, owner). The owner synthesizes; everyone else waits on the future."""
+    key = str(fpath)
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        if fut is not None:
+            tts_cache_stats["deduped"] += 1
+            return fut, False
+        fut = Future()
+        _inflight[key] = fut
+        tts_cache_stats["misses"] += 1
+        return fut, True
+
+
+def _release(fpath):
+    with _inflight_lock:
+        _inflight.pop(str(fpath), None)
+
+
+# Wraps each synthesis that actually runs, e.g. in rate and concurrency
+# limits: limit(call) awaits call(), which returns a fresh coroutine per attempt
+Limit = Callable[[Callable[[], Awaitable]], Awaitable]
+
+
+# One thread per slot the TTS limiter can grant. Calls never queue for a
+# thread, so the limiter measures the service's latency, not ours.
+_synthesis_executor = ThreadPoolExecutor(max_workers=max(1, TTS_MAX_CONCURRENCY),
+                                         thread_name_prefix="tts")
+
+
+async def _unlimited(call: Callable[[], Awaitable]):
+    return await call()
+
+
+async def _in_synthesis_thread(fn, *args):
+    """Like `asyncio.to_thread`, on the TTS executor."""
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(_synthesis_executor, call)
+
+
+async def async_cached_audio(fpath, synthesize: Callable[[], bytes], limit: Optional[Limit] = None):
+    """
+    Make sure the content-addressed audio file at `fpath` exists.
+
+    Skips synthesis when the file is already on disk and collapses concurrent
+    requests for the same file into a single `synthesize()` call, which runs
+    in a thread under `limit`. Cache hits and waits never enter `limit`.
+    """
+    if os.path.exists(fpath):
+        tts_cache_stats["hits"] += 1
+        return fpath
+    fut, owner = _claim(fpath)
+    if not owner:
+        return await asyncio.wrap_future(fut)
+    try:
+        audio = await (limit or _unlimited)(lambda: _in_synthesis_thread(synthesize))
+        await asyncio.to_thread(write_audio_atomic, fpath, audio)
+        fut.set_result(fpath)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        _release(fpath)
+    return fpath
+
+
+async def async_cached_audio_batch(fpaths: list, synthesize_many: Callable[[list], list],
+                                   limit: Optional[Limit] = None):
+    """
+    Batched `async_cached_audio`: make sure every file in `fpaths` exists.
+
+    `synthesize_many(positions)` receives the positions in `fpaths` that still
+    need audio and returns their bytes in the same order; it runs under
+    `limit`. Files already on disk or being synthesized by another caller are
+    not requested again.
+    """
+    owned, waiting, seen = [], [], set()
+    for i, fpath in enumerate(fpaths):
+        if str(fpath) in seen:
+            continue
+        seen.add(str(fpath))
+        if os.path.exists(fpath):
+            tts_cache_stats["hits"] += 1
+            continue
+        fut, owner = _claim(fpath)
+        (owned if owner else waiting).append((i, fut))
+
+    if owned:
+        try:
+            positions = [i for i, _ in owned]
+            segments = await (limit or _unlimited)(
+                lambda: _in_synthesis_thread(synthesize_many, positions)
+            )
+            for (i, fut), segment in zip(owned, segments):
+                await asyncio.to_thread(write_audio_atomic, fpaths[i], segment)
+                fut.set_result(fpaths[i])
+        except BaseException as e:
+            for _, fut in owned:
+                if not fut.done():
+                    fut.set_exception(e)
+            raise
+        finally:
+            for i, _ in owned:
+                _release(fpaths[i])
+
+    for _, fut in waiting:
+        await asyncio.wrap_future(fut)
+
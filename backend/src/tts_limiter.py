@@ -0,0 +1,205 @@
+"""
+Adaptive concurrency control for TTS requests.
+
+`AdaptiveLimiter` is an AIMD controller: the number of concurrent requests
+grows by about one per round of requests that finish within the latency
+target, and is halved when the service throttles (429, quota, 503) or times
+out. On top of it, each locale has a token bucket, failed calls are retried
+with jittered exponential backoff, and items that still fail are kept in a
+retry queue and tried again later.
+
+Everything here runs on the API's background event loop.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.metrics import errors, registry
+from src.retry import DEADLINE, THROTTLE, backoff_delay, classify_error
+
+TTS_CONCURRENCY = int(os.getenv("APRENDIA_TTS_CONCURRENCY", "5"))  # starting limit
+TTS_MIN_CONCURRENCY = int(os.getenv("APRENDIA_TTS_MIN_CONCURRENCY", "1"))
+TTS_MAX_CONCURRENCY = int(os.getenv("APRENDIA_TTS_MAX_CONCURRENCY", "32"))
+# Calls slower than this count as congestion and stop the limit from growing
+TTS_TARGET_LATENCY = float(os.getenv("APRENDIA_TTS_TARGET_LATENCY", "5"))
+# Requests per second per locale (0 = no rate limit), and the burst allowed
+TTS_LOCALE_RATE = float(os.getenv("APRENDIA_TTS_LOCALE_RATE", "0"))
+TTS_LOCALE_BURST = int(os.getenv("APRENDIA_TTS_LOCALE_BURST", "10"))
+TTS_RETRIES = int(os.getenv("APRENDIA_TTS_RETRIES", "4"))
+TTS_BACKOFF_BASE = float(os.getenv("APRENDIA_TTS_BACKOFF_BASE", "0.5"))
+TTS_BACKOFF_MAX = float(os.getenv("APRENDIA_TTS_BACKOFF_MAX", "30"))
+# Items that used up their retries are tried again every interval, a few times
+TTS_RETRY_INTERVAL = float(os.getenv("APRENDIA_TTS_RETRY_INTERVAL", "60"))
+TTS_RETRY_ROUNDS = int(os.getenv("APRENDIA_TTS_RETRY_ROUNDS", "5"))
+
+tts_retries = registry.counter(
+    "aprendia_tts_retries_total",
+    "TTS calls retried after an error, by error class.",
+    ("reason",),
+)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted by additive increase / multiplicative decrease."""
+
+    def __init__(self, initial: int = TTS_CONCURRENCY, minimum: int = TTS_MIN_CONCURRENCY,
+                 maximum: int = TTS_MAX_CONCURRENCY, target_latency: float = TTS_TARGET_LATENCY):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.inflight = 0
+        self._cond: Optional[asyncio.Condition] = None  # created on the loop
+        self._last_decrease = 0.0
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+
+    async def release(self, latency: float, outcome: Optional[str]):
+        """Give a slot back and adapt the limit to how the call went."""
+        cond = self._condition()
+        async with cond:
+            self.inflight -= 1
+            if outcome is None and latency <= self.target_latency:
+                # +1 per limit's worth of healthy calls, i.e. about one per round
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome in (THROTTLE, DEADLINE):
+                # Halve on every throttled call sent after the last decrease.
+                # Calls already in flight then belong to the same window, so
+                # one burst of errors halves the limit once, not per error.
+                now = time.monotonic()
+                if now - latency >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+                    logging.info(f"TTS concurrency limit lowered to {int(self.limit)} ({outcome})")
+            cond.notify_all()
+
+
+class TokenBucket:
+    """Requests-per-second limit; `rate` <= 0 disables it."""
+
+    def __init__(self, rate: float = TTS_LOCALE_RATE, burst: int = TTS_LOCALE_BURST):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self):
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self):
+        """Spend the burst after the service reported quota exhaustion."""
+        if self.rate > 0:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class RetryQueue:
+    """Failed items, tried again every `interval` seconds up to `rounds` times."""
+
+    def __init__(self, interval: float = TTS_RETRY_INTERVAL, rounds: int = TTS_RETRY_ROUNDS):
+        self.interval = interval
+        self.rounds = rounds
+        self._items: "OrderedDict[str, list]" = OrderedDict()  # key -> [fn, rounds tried]
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, key: str, fn: Callable[[], Awaitable]):
+        """Queue `fn` (an async callable) for a later attempt; one entry per key."""
+        if self.rounds <= 0 or key in self._items:
+            return
+        self._items[key] = [fn, 0]
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._items:
+            await asyncio.sleep(self.interval)
+            for key in list(self._items):
+                fn, tried = self._items.pop(key)
+                try:
+                    await fn()
+                except Exception as e:
+                    if tried + 1 < self.rounds:
+                        self._items[key] = [fn, tried + 1]
+                    else:
+                        logging.warning(f"TTS retry queue: giving up on {key}: {e}")
+                        errors.inc(stage="tts_retry")
+
+
+class TTSLimiter:
+    """Adaptive concurrency, per-locale rate limits and retries for TTS calls."""
+
+    def __init__(self):
+        self.limiter = AdaptiveLimiter()
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.retry_queue = RetryQueue()
+
+    async def call(self, locale: str, fn: Callable[[], Awaitable], wait_metric=None):
+        """
+        Await `fn()` within the limits, retrying throttling, deadline and
+        transient errors with jittered backoff. Raises the last error.
+        """
+        bucket = self.buckets.setdefault(locale, TokenBucket())
+        for attempt in range(TTS_RETRIES + 1):
+            await bucket.take()
+            if wait_metric is not None:
+                with wait_metric.time():
+                    await self.limiter.acquire()
+            else:
+                await self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                result = await fn()
+            except Exception as e:
+                reason = classify_error(e)
+                await self.limiter.release(time.perf_counter() - start, reason or "error")
+                if reason is None or attempt == TTS_RETRIES:
+                    raise
+                if reason == THROTTLE:
+                    bucket.drain()
+                tts_retries.inc(reason=reason)
+                await asyncio.sleep(backoff_delay(attempt, TTS_BACKOFF_BASE, TTS_BACKOFF_MAX))
+                continue
+            await self.limiter.release(time.perf_counter() - start, None)
+            return result
+
+    def retry_later(self, key: str, fn: Callable[[], Awaitable]):
+        self.retry_queue.add(key, fn)
+
+
+tts_limiter = TTSLimiter()
+
+registry.callback(
+    "aprendia_tts_concurrency_limit", "Current adaptive TTS concurrency limit.", "gauge",
+    lambda: [({}, int(tts_limiter.limiter.limit))],
+)
+registry.callback(
+    "aprendia_tts_retry_queue", "TTS items waiting for another attempt.", "gauge",
+    lambda: [({}, len(tts_limiter.retry_queue))],
+)
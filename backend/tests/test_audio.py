@@ -0,0 +1,127 @@
+import struct
+
+import pytest
+
+from src.audio import _ogg_crc, _ogg_page, _ogg_packets, mp3_frames, split_mp3, split_ogg_opus
+
+# MPEG1 layer III, 128 kbit/s, 44.1 kHz, no padding: 417 bytes, 1152 samples
+FRAME_HEADER = b"\xff\xfb\x90\x00"
+FRAME_BYTES = 417
+FRAME_SECONDS = 1152 / 44100
+
+OPUS_HEAD = b"OpusHead" + bytes([1, 1]) + struct.pack("<HI", 312, 16000) + b"\x00\x00\x00"
+OPUS_TAGS = b"OpusTags" + struct.pack("<II", 0, 0)
+OPUS_PACKET_SECONDS = 0.02  # TOC config 31: one 20 ms CELT frame
+
+
+def frame(fill: int) -> bytes:
+    return FRAME_HEADER + bytes([fill]) * (FRAME_BYTES - len(FRAME_HEADER))
+
+
+def frames(count: int, start: int = 0) -> bytes:
+    return b"".join(frame(start + i) for i in range(count))
+
+
+def test_mp3_frames_walks_frame_headers():
+    found = list(mp3_frames(frames(3)))
+
+    assert [(offset, length) for offset, length, _ in found] == [(0, 417), (417, 417), (834, 417)]
+    assert all(abs(duration - FRAME_SECONDS) < 1e-9 for _, _, duration in found)
+
+
+def test_mp3_frames_skips_id3_tag_and_garbage():
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"\x00" * 5
+    audio = id3 + frames(1) + b"junk" + frames(1, start=1)
+
+    assert [offset for offset, _, _ in mp3_frames(audio)] == [15, 15 + 417 + 4]
+
+
+def test_split_mp3_cuts_at_frame_boundaries():
+    audio = frames(10)
+    segments = split_mp3(audio, [3 * FRAME_SECONDS, 7 * FRAME_SECONDS])
+
+    assert segments == [frames(3), frames(4, start=3), frames(3, start=7)]
+
+
+def test_split_mp3_snaps_cuts_to_the_nearest_frame():
+    audio = frames(4)
+    segments = split_mp3(audio, [1.4 * FRAME_SECONDS, 2.6 * FRAME_SECONDS])
+
+    assert segments == [frames(1), frames(2, start=1), frames(1, start=3)]
+
+
+def test_split_mp3_keeps_every_frame_once():
+    audio = frames(20)
+    segments = split_mp3(audio, [0.1, 0.2, 0.3])
+
+    assert len(segments) == 4
+    assert b"".join(segments) == audio
+
+
+def test_split_mp3_leaves_empty_segments_past_the_end():
+    segments = split_mp3(frames(2), [10.0])
+
+    assert segments == [frames(2), b""]
+
+
+def opus_packet(i: int) -> bytes:
+    # Some packets need more than one lacing value
+    return bytes([31 << 3]) + bytes([i % 256]) * (i * 37 % 600)
+
+
+def ogg_opus(packets: list, per_page: int = 40) -> bytes:
+    pages = [_ogg_page(7, 0, 0, 0x02, [OPUS_HEAD]), _ogg_page(7, 1, 0, 0, [OPUS_TAGS])]
+    for start in range(0, len(packets), per_page):
+        pages.append(_ogg_page(7, len(pages), 960 * (start + per_page), 0, packets[start:start + per_page]))
+    return b"".join(pages)
+
+
+def ogg_pages(stream: bytes) -> list:
+    pages, pos = [], 0
+    while pos < len(stream):
+        count = stream[pos + 26]
+        length = 27 + count + sum(stream[pos + 27:pos + 27 + count])
+        pages.append(stream[pos:pos + length])
+        pos += length
+    return pages
+
+
+def test_ogg_crc_matches_the_reference_check_value():
+    # Same polynomial as CRC-32/POSIX, which also inverts the result
+    assert _ogg_crc(b"123456789") ^ 0xFFFFFFFF == 0x765E7680
+
+
+def test_split_ogg_opus_cuts_at_packet_boundaries():
+    packets = [opus_packet(i) for i in range(150)]
+    streams = split_ogg_opus(ogg_opus(packets), [1.0, 2.0])
+
+    slices = []
+    for stream in streams:
+        serial, stream_packets = _ogg_packets(stream)
+        assert serial == 7
+        assert stream_packets[:2] == [OPUS_HEAD, OPUS_TAGS]
+        slices.append(stream_packets[2:])
+    # The 312-sample pre-skip shifts each cut by a fraction of a packet
+    assert [len(s) for s in slices] == [50, 50, 50]
+    assert sum(slices, []) == packets
+
+
+def test_split_ogg_opus_writes_valid_pages():
+    streams = split_ogg_opus(ogg_opus([opus_packet(i) for i in range(100)]), [1.0])
+
+    for stream in streams:
+        pages = ogg_pages(stream)
+        flags = [page[5] for page in pages]
+        assert flags[0] == 0x02 and flags[-1] == 0x04
+        assert [struct.unpack_from("<I", page, 18)[0] for page in pages] == list(range(len(pages)))
+        for page in pages:
+            blank = page[:22] + b"\x00" * 4 + page[26:]
+            assert struct.unpack_from("<I", page, 22)[0] == _ogg_crc(blank)
+        assert struct.unpack_from("<q", pages[-1], 6)[0] == 50 * round(OPUS_PACKET_SECONDS * 48000)
+
+
+def test_split_ogg_opus_rejects_other_streams():
+    with pytest.raises(ValueError):
+        split_ogg_opus(b"ID3" + b"\x00" * 20, [1.0])
+    with pytest.raises(ValueError):
+        split_ogg_opus(_ogg_page(1, 0, 0, 0x02, [b"Vorbis"]) + _ogg_page(1, 1, 0, 0, [b"x"]), [1.0])
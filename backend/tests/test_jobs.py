@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from src import jobs
+from src.jobs import JobQueue
+
+
+@pytest.fixture
+def queues(tmp_path):
+    """Job queues on one tmp database; all of them are stopped afterwards."""
+    path = str(tmp_path / "jobs.db")
+    made = []
+
+    def make(**kwargs) -> JobQueue:
+        queue = JobQueue(path, **kwargs)
+        made.append(queue)
+        return queue
+
+    yield make
+    for queue in made:
+        queue.stop()
+
+
+def wait_for(queue: JobQueue, job_ids, statuses=("done", "failed"), timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        found = [queue.get(job_id) for job_id in job_ids]
+        if all(job.status in statuses for job in found):
+            return found
+        time.sleep(0.01)
+    raise AssertionError(f"Jobs did not finish: {[(j.id, j.status) for j in found]}")
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_each_job_is_claimed_once_across_queues(queues):
+    runs, lock = [], threading.Lock()
+
+    def handler(name):
+        def run(payload):
+            with lock:
+                runs.append((name, payload["n"]))
+        return run
+
+    first, second = queues(workers=2), queues(workers=2)
+    first.register("count", handler("first"))
+    second.register("count", handler("second"))
+    # Both start before any job runs: a queue treats running jobs of its own pid
+    # as left over from a previous run
+    first.start()
+    second.start()
+    job_ids = [(first, second)[n % 2].enqueue("count", {"n": n}).id for n in range(30)]
+
+    finished = wait_for(first, job_ids)
+    assert sorted(n for _, n in runs) == list(range(30))
+    assert {name for name, _ in runs} == {"first", "second"}
+    assert all(job.attempts == 1 for job in finished)
+
+
+def test_jobs_of_a_dead_process_are_requeued_at_start(queues):
+    queue = queues(workers=1)
+    ran = []
+    queue.register("orphan", ran.append)
+    job = queue.enqueue("orphan", {"n": 1})
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET status = 'running', attempts = 1, owner_pid = ? "
+                     "WHERE id = ?", (dead_pid(), job.id))
+
+    queue.start()
+
+    [finished] = wait_for(queue, [job.id])
+    assert finished.status == "done"
+    assert finished.attempts == 2
+    assert ran == [{"n": 1}]
+
+
+def test_jobs_of_a_live_process_are_left_running(queues):
+    queue = queues(workers=1)
+    queue.register("busy", lambda payload: None)
+    job = queue.enqueue("busy", {})
+    with sqlite3.connect(queue.path) as conn:
+        # The pytest runner's parent stands in for another live worker
+        conn.execute("UPDATE jobs SET status = 'running', owner_pid = ? WHERE id = ?",
+                     (os.getppid(), job.id))
+
+    queue.start()
+    time.sleep(0.1)
+
+    assert queue.get(job.id).status == "running"
+
+
+def test_failing_jobs_stop_after_max_attempts(queues, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 3)
+    calls = []
+
+    def handler(payload):
+        calls.append(payload)
+        raise RuntimeError("model unavailable")
+
+    queue = queues(workers=1)
+    queue.register("flaky", handler)
+    job = queue.enqueue("flaky", {})
+    queue.start()
+
+    [failed] = wait_for(queue, [job.id])
+    assert failed.status == "failed"
+    assert failed.attempts == 3
+    assert failed.error == "model unavailable"
+    assert len(calls) == 3
+
+
+def test_enqueue_raises_queue_full_at_max_depth(queues):
+    queue = queues(max_depth=2)
+    queue.register("noop", lambda payload: None)
+    queue.enqueue("noop", {})
+    queue.enqueue("noop", {})
+
+    with pytest.raises(jobs.QueueFull, match="2 pending"):
+        queue.enqueue("noop", {})
+    assert queue.depth() == 2
+    # The limit is on pending jobs, so it applies across queues sharing the file
+    other = queues(max_depth=2)
+    other.register("noop", lambda payload: None)
+    with pytest.raises(jobs.QueueFull):
+        other.enqueue("noop", {})
+
+
+def test_enqueue_rejects_unknown_kinds(queues):
+    with pytest.raises(ValueError, match="No handler"):
+        queues().enqueue("missing", {})
+
+
+def test_jobs_run_in_priority_order(queues):
+    queue = queues(workers=1)
+    ran = []
+    queue.register("work", lambda payload: ran.append(payload["name"]))
+    job_ids = [
+        queue.enqueue("work", {"name": "bulk"}, priority=jobs.PRIORITY_BULK).id,
+        queue.enqueue("work", {"name": "first"}).id,
+        queue.enqueue("work", {"name": "second"}).id,
+    ]
+    queue.start()
+
+    wait_for(queue, job_ids)
+    assert ran == ["first", "second", "bulk"]
+
+
+def test_start_resumes_jobs_left_by_a_previous_run(queues):
+    previous = queues()
+    previous.register("resume", lambda payload: None)
+    interrupted = previous.enqueue("resume", {}).id
+    queued = previous.enqueue("resume", {}).id
+    assert previous._claim().id == interrupted
+    previous._conn.close()
+
+    # A restart keeps the pid only in tests; a job of our own pid is still orphaned
+    queue = queues(workers=1)
+    ran = []
+    queue.register("resume", lambda payload: ran.append(payload))
+    queue.start()
+
+    finished = wait_for(queue, [interrupted, queued])
+    assert [job.status for job in finished] == ["done", "done"]
+    assert [job.attempts for job in finished] == [2, 1]
+    assert len(ran) == 2
@@ -0,0 +1,140 @@
+import threading
+import time
+
+import pytest
+
+from src import llm_calls
+
+KIND = "test"
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Empty latency history, two slots and short deadlines and backoff."""
+    monkeypatch.setattr(llm_calls, "latencies", llm_calls.LatencyWindow())
+    monkeypatch.setattr(llm_calls, "_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(llm_calls, "LLM_HEDGE", False)
+    monkeypatch.setattr(llm_calls, "LLM_BACKOFF_BASE", 0.01)
+    monkeypatch.setenv(f"APRENDIA_LLM_DEADLINE_{KIND.upper()}", "2")
+
+
+def count(metric, **labels) -> float:
+    return metric._values.get(metric._key(labels), 0)
+
+
+def seen_latency(seconds: float):
+    for _ in range(llm_calls.LLM_HEDGE_MIN_SAMPLES):
+        llm_calls.latencies.record(KIND, seconds)
+
+
+class Responses:
+    """Request function serving `outcomes` in turn: a value, an exception or an Event to wait on."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+            self.calls += 1
+        if isinstance(outcome, threading.Event):
+            outcome.wait(5)
+            return "late"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def wait_until(condition, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_returns_the_result_without_hedging_fast_requests(monkeypatch):
+    monkeypatch.setattr(llm_calls, "LLM_HEDGE", True)
+    seen_latency(0.5)
+    fn = Responses("ok")
+    hedges = count(llm_calls.llm_hedges, kind=KIND)
+
+    assert llm_calls.call(KIND, fn) == "ok"
+    assert fn.calls == 1
+    assert count(llm_calls.llm_hedges, kind=KIND) == hedges
+
+
+def test_hedge_fires_after_the_p95_and_the_first_answer_wins(monkeypatch):
+    monkeypatch.setattr(llm_calls, "LLM_HEDGE", True)
+    seen_latency(0.1)
+    stuck = threading.Event()
+    fn = Responses(stuck, "hedged")
+    hedges = count(llm_calls.llm_hedges, kind=KIND)
+    wins = count(llm_calls.llm_hedge_wins, kind=KIND)
+
+    start = time.monotonic()
+    result = llm_calls.call(KIND, fn)
+    elapsed = time.monotonic() - start
+    stuck.set()
+
+    assert result == "hedged"
+    assert 0.1 <= elapsed < 1
+    assert fn.calls == 2
+    assert count(llm_calls.llm_hedges, kind=KIND) == hedges + 1
+    assert count(llm_calls.llm_hedge_wins, kind=KIND) == wins + 1
+
+
+def test_requests_are_not_hedged_until_enough_latencies_are_seen(monkeypatch):
+    monkeypatch.setattr(llm_calls, "LLM_HEDGE", True)
+    slow = threading.Event()
+    threading.Timer(0.2, slow.set).start()
+    fn = Responses(slow, "hedged")
+
+    assert llm_calls.call(KIND, fn) == "late"
+    assert fn.calls == 1
+
+
+def test_retries_transient_errors():
+    fn = Responses(ConnectionError("reset"), "ok")
+    retries = count(llm_calls.llm_retries, kind=KIND, reason="transient")
+
+    assert llm_calls.call(KIND, fn) == "ok"
+    assert fn.calls == 2
+    assert count(llm_calls.llm_retries, kind=KIND, reason="transient") == retries + 1
+
+
+def test_gives_up_after_the_retry_limit(monkeypatch):
+    monkeypatch.setattr(llm_calls, "LLM_RETRIES", 2)
+    fn = Responses(ConnectionError("reset"))
+
+    with pytest.raises(ConnectionError):
+        llm_calls.call(KIND, fn)
+    assert fn.calls == 3
+
+
+def test_does_not_retry_other_errors():
+    fn = Responses(ValueError("bad prompt"), "ok")
+
+    with pytest.raises(ValueError, match="bad prompt"):
+        llm_calls.call(KIND, fn)
+    assert fn.calls == 1
+
+
+def test_deadline_keeps_the_slot_until_the_abandoned_request_ends(monkeypatch):
+    monkeypatch.setattr(llm_calls, "_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setenv(f"APRENDIA_LLM_DEADLINE_{KIND.upper()}", "0.1")
+    outstanding = count(llm_calls.llm_outstanding)
+    stuck = threading.Event()
+
+    with pytest.raises(TimeoutError, match="0.1s deadline"):
+        llm_calls.call(KIND, Responses(stuck))
+    # The abandoned attempt still runs, so its slot is not free yet
+    assert count(llm_calls.llm_outstanding) == outstanding + 1
+    with pytest.raises(TimeoutError):
+        llm_calls.call(KIND, Responses("ok"))
+
+    stuck.set()
+    wait_until(lambda: count(llm_calls.llm_outstanding) == outstanding)
+    assert llm_calls.call(KIND, Responses("ok")) == "ok"
+    assert count(llm_calls.llm_outstanding) == outstanding
@@ -0,0 +1,119 @@
+import pytest
+
+from src.models import SentencePair, SentenceStore
+
+HASHED_URL = "/audio/es_co/es_co_0123456789abcdef.mp3"
+
+
+def pair(sentence_id: int, **fields) -> SentencePair:
+    fields.setdefault("source_text", f"source {sentence_id}")
+    fields.setdefault("target_text", f"target {sentence_id}")
+    return SentencePair(id=sentence_id, **fields)
+
+
+def test_round_trips_sentence_pairs():
+    store = SentenceStore()
+    sp = pair(3, source_audio=HASHED_URL, order=2)
+    store[3] = sp
+
+    assert store[3] == sp
+    assert 3 in store and 2 not in store and "3" not in store
+    assert len(store) == 1
+    assert list(store) == [3]
+    assert dict(store.items()) == {3: sp}
+
+
+def test_missing_ids_raise_key_error():
+    store = SentenceStore()
+    store[1] = pair(1)
+
+    with pytest.raises(KeyError):
+        store[0]
+    with pytest.raises(KeyError):
+        store[99]
+    assert store.get(99) is None
+    assert store.get(99, "default") == "default"
+
+
+def test_overwriting_keeps_the_row():
+    store = SentenceStore()
+    store[1] = pair(1)
+    store[1] = pair(1, target_text="changed", order=5)
+
+    assert len(store) == 1
+    assert store[1].target_text == "changed"
+    assert store[1].order == 5
+
+
+def test_content_addressed_urls_are_rebuilt_from_the_hash():
+    store = SentenceStore()
+    store[1] = pair(1, source_audio=HASHED_URL, target_audio="/audio/en_us/en_us_ffffffffffffffff.mp3")
+
+    assert store._raw_urls == {}
+    assert store[1].source_audio == HASHED_URL
+    assert store[1].target_audio == "/audio/en_us/en_us_ffffffffffffffff.mp3"
+
+
+@pytest.mark.parametrize("url", [
+    "/audio/es_co/es_co_0123.mp3",  # short hash
+    "/audio/es_co/en_us_0123456789abcdef.mp3",  # locale mismatch
+    "/audio/es_co/es_co_0123456789abcdef.ogg",
+    "https://cdn.example.com/a.mp3",
+])
+def test_other_urls_are_kept_verbatim(url):
+    store = SentenceStore()
+    store[1] = pair(1, source_audio=url)
+
+    assert store[1].source_audio == url
+    assert store[1].target_audio == ""
+
+
+def test_replacing_a_raw_url_with_a_hashed_one_drops_it():
+    store = SentenceStore()
+    store[1] = pair(1, source_audio="https://cdn.example.com/a.mp3")
+    store[1] = pair(1, source_audio=HASHED_URL)
+
+    assert store._raw_urls == {}
+    assert store[1].source_audio == HASHED_URL
+
+
+def test_deleted_rows_are_reused():
+    store = SentenceStore()
+    for sid in range(3):
+        store[sid] = pair(sid, source_audio=f"https://cdn.example.com/{sid}.mp3")
+    row = store._rows[1]
+    del store[1]
+
+    assert 1 not in store
+    assert len(store) == 2
+    assert store._raw_urls.get(2 * row) is None
+
+    store[7] = pair(7)
+    assert store._rows[7] == row
+    assert len(store._ids) == 3
+    assert store[7] == pair(7)
+    assert sorted(store) == [0, 2, 7]
+
+
+def test_pop():
+    store = SentenceStore()
+    store[4] = pair(4)
+
+    assert store.pop(4) == pair(4)
+    assert 4 not in store
+    assert store.pop(4, None) is None
+    with pytest.raises(KeyError):
+        store.pop(4)
+
+
+def test_clear():
+    store = SentenceStore()
+    store[0] = pair(0, source_audio="https://cdn.example.com/a.mp3")
+    store[1] = pair(1, source_audio=HASHED_URL)
+    store.clear()
+
+    assert len(store) == 0
+    assert list(store) == []
+    assert 0 not in store
+    store[0] = pair(0)
+    assert store[0] == pair(0)
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from src.prompts import parse_sentence_pairs
+
+
+def test_parses_pairs_in_order():
+    response = json.dumps([
+        {"source": "The cat sleeps.", "target": "El gato duerme."},
+        {"source": "It is raining.", "target": "Está lloviendo."},
+    ])
+
+    assert parse_sentence_pairs(response) == [
+        ("The cat sleeps.", "El gato duerme."),
+        ("It is raining.", "Está lloviendo."),
+    ]
+
+
+def test_strips_whitespace_and_ignores_extra_keys():
+    response = json.dumps([{"source": "  Hello. ", "target": "\tHola.\n", "note": "greeting"}])
+
+    assert parse_sentence_pairs(response) == [("Hello.", "Hola.")]
+
+
+@pytest.mark.parametrize("response, message", [
+    ("not json", "not valid JSON"),
+    ('{"source": "a", "target": "b"}', "non-empty JSON array"),
+    ("[]", "non-empty JSON array"),
+    ('["a", "b"]', "Item 0 is not an object"),
+    ('[{"source": "a"}]', "Item 0 is missing"),
+    ('[{"source": "a", "target": 1}]', "Item 0 is missing"),
+    ('[{"source": "a", "target": "b"}, {"source": " ", "target": "b"}]', "Item 1 has an empty"),
+    ('[{"source": "a\\nb", "target": "c"}]', "Item 0 spans more than one line"),
+])
+def test_rejects_malformed_responses(response, message):
+    with pytest.raises(ValueError, match=message):
+        parse_sentence_pairs(response)
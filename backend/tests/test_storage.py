@@ -0,0 +1,109 @@
+import pytest
+
+from src import models, storage
+from src.models import SentencePair, SentenceStore, Story, Studiable
+from src.storage import SQLiteStorage
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """Two connections to one database, as two worker processes would have."""
+    monkeypatch.setattr(storage, "SEED_PATH", "")
+    models.reset_db()
+    path = str(tmp_path / "aprendia.db")
+    a, b = SQLiteStorage(path), SQLiteStorage(path)
+    db_b = {"stories": {}, "studiables": {}, "sentences": SentenceStore()}
+    # Studiables read their sentences from the module-level db, so A writes from it
+    a.load_into(models.db)
+    b.load_into(db_b)
+    yield a, b, db_b
+    a.close()
+    b.close()
+    models.reset_db()
+
+
+def add_story(store: SQLiteStorage) -> Story:
+    story = Story(id=store.allocate_ids("stories")[0], title="Story", source_locale="en-US",
+                  target_locale="es-CO", metadata={})
+    models.db["stories"][story.id] = story
+    store.save_story(story)
+    return story
+
+
+def add_sentences(store: SQLiteStorage, texts: list) -> list:
+    ids = store.allocate_ids("sentences", len(texts))
+    pairs = [SentencePair(id=sid, source_text=text, target_text=text.upper(), order=i)
+             for i, (sid, text) in enumerate(zip(ids, texts))]
+    for sp in pairs:
+        models.db["sentences"][sp.id] = sp
+    return pairs
+
+
+def add_studiable(store: SQLiteStorage, story: Story, texts: list) -> Studiable:
+    studiable = Studiable(id=store.allocate_ids("studiables")[0], story_id=story.id,
+                          title="Chapter", raw_text=" ".join(texts), metadata={})
+    studiable.sentences = add_sentences(store, texts)
+    models.db["studiables"][studiable.id] = studiable
+    store.save_studiable(studiable)
+    return studiable
+
+
+def test_sync_replays_changes_from_another_connection(stores):
+    a, b, db_b = stores
+    story = add_story(a)
+    studiable = add_studiable(a, story, ["one", "two"])
+
+    changes = b.sync(db_b)
+
+    assert [(kind, obj.id, previous) for kind, obj, previous in changes] == [
+        ("story", story.id, None), ("studiable", studiable.id, None),
+    ]
+    synced = db_b["studiables"][studiable.id]
+    assert list(synced.sentence_ids) == list(studiable.sentence_ids)
+    assert [db_b["sentences"][sid].target_text for sid in synced.sentence_ids] == ["ONE", "TWO"]
+    assert b.sync(db_b) == []
+
+
+def test_sync_skips_changes_from_its_own_connection(stores):
+    a, b, db_b = stores
+    add_studiable(a, add_story(a), ["one"])
+
+    assert a.sync(models.db) == []
+
+
+def test_sync_updates_replaced_studiables_in_place(stores):
+    a, b, db_b = stores
+    studiable = add_studiable(a, add_story(a), ["one", "two"])
+    b.sync(db_b)
+    synced = db_b["studiables"][studiable.id]
+    old_ids = list(synced.sentence_ids)
+
+    studiable.sentences = add_sentences(a, ["three"])
+    a.save_studiable(studiable)
+    [(kind, obj, previous)] = b.sync(db_b)
+
+    assert obj is synced
+    assert list(previous.sentence_ids) == old_ids
+    assert [db_b["sentences"][sid].source_text for sid in synced.sentence_ids] == ["three"]
+    # The caller drops the old rows once nothing reads them
+    assert all(sid in db_b["sentences"] for sid in old_ids)
+
+
+def test_ids_and_chapter_numbers_are_distinct_across_connections(stores):
+    a, b, db_b = stores
+    story = add_story(a)
+
+    ids = [store.allocate_ids("sentences", 3) for store in (a, b, a, b)]
+    flat = [sid for r in ids for sid in r]
+    assert len(set(flat)) == len(flat)
+
+    def add_chapter(store: SQLiteStorage) -> Studiable:
+        # The studiable id is allocated first: build runs inside the write transaction
+        studiable_id = store.allocate_ids("studiables")[0]
+        return store.add_chapter(story.id, lambda number: Studiable(
+            id=studiable_id, story_id=story.id, title=f"Chapter {number}", raw_text="",
+            metadata={"type": "chapter", "chapter_number": number},
+        ))
+
+    chapters = [add_chapter(store) for store in (a, b, b, a)]
+    assert [c.metadata["chapter_number"] for c in chapters] == [1, 2, 3, 4]
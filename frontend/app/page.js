@@ -21,9 +21,15 @@ export default function Home() {
 
   const fetchStories = async () => {
     try {
-      const res = await fetch('/api/stories');
-      const data = await res.json();
-      setStories(data);
+      // The API pages stories; follow X-Next-Cursor until the last page
+      let all = [];
+      let cursor = null;
+      do {
+        const res = await fetch(cursor ? `/api/stories?cursor=${cursor}` : '/api/stories');
+        all = all.concat(await res.json());
+        cursor = res.headers.get('X-Next-Cursor');
+      } while (cursor);
+      setStories(all);
     } catch (error) {
       console.error('Error fetching stories:', error);
     }
@@ -2,22 +2,46 @@
 
 import { useState, useEffect } from 'react';
 
+// Progress events that change what this view shows
+const REFRESH_EVENTS = ['studiable_created', 'sentence_created', 'studiable_ready', 'error'];
+
 export default function StoryDetailView({ story, onStudiableSelect, onCreateChapter }) {
   const [studiables, setStudiables] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
 
   useEffect(() => {
     fetchStudiables();
-    // Poll for updates every 3 seconds to check if chapters/quizzes are done processing
-    const interval = setInterval(fetchStudiables, 3000);
-    return () => clearInterval(interval);
+    // Refresh when the backend reports progress instead of polling
+    const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
+    const source = new EventSource(`${backendUrl}/stories/${story.id}/events`);
+    let refreshTimer = null;
+    source.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+      if (!REFRESH_EVENTS.includes(event.type)) return;
+      // Coalesce bursts of events (e.g. a chapter's sentences) into one fetch
+      clearTimeout(refreshTimer);
+      refreshTimer = setTimeout(fetchStudiables, 250);
+    };
+    // Catch up on anything missed while the connection was down
+    source.onopen = () => fetchStudiables();
+    return () => {
+      clearTimeout(refreshTimer);
+      source.close();
+    };
   }, [story.id]);
 
   const fetchStudiables = async () => {
     try {
-      const res = await fetch(`/api/stories/${story.id}/studiables`);
-      const data = await res.json();
-      setStudiables(data);
+      // The API pages studiables; follow X-Next-Cursor until the last page
+      let all = [];
+      let cursor = null;
+      do {
+        const url = `/api/stories/${story.id}/studiables`;
+        const res = await fetch(cursor ? `${url}?cursor=${cursor}` : url);
+        all = all.concat(await res.json());
+        cursor = res.headers.get('X-Next-Cursor');
+      } while (cursor);
+      setStudiables(all);
       setIsLoading(false);
     } catch (error) {
       console.error('Error fetching studiables:', error);
@@ -8,35 +8,82 @@ export default function StudyDeck({ studiable, onBack }) {
   const [showingFront, setShowingFront] = useState(true);
   const [showTargetText, setShowTargetText] = useState(false);
   const [isLoading, setIsLoading] = useState(true);
+  const [bundles, setBundles] = useState({});
   const audioRef = useRef(null);
+  const segmentRef = useRef(null);
+  const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
 
   useEffect(() => {
     fetchStudiable();
   }, [studiable.id]);
 
+  useEffect(() => {
+    // Release downloaded bundles when leaving the deck
+    return () => Object.values(bundles).forEach(b => URL.revokeObjectURL(b.src));
+  }, [bundles]);
+
   const fetchStudiable = async () => {
     try {
       const res = await fetch(`/api/studiables/${studiable.id}`);
       const data = await res.json();
       setSentences(data.sentences || []);
       setIsLoading(false);
+      loadBundles(data.metadata?.audio_bundles || {});
     } catch (error) {
       console.error('Error fetching studiable:', error);
       setIsLoading(false);
     }
   };
 
-  useEffect(() => {
-    // Auto-play audio when card changes or flips
-    if (sentences.length > 0 && audioRef.current) {
-      const currentSentence = sentences[currentIndex];
-      const audioPath = showingFront ? currentSentence.target_audio : currentSentence.source_audio;
-      if (audioPath) {
-        const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
-        audioRef.current.src = `${backendUrl}${audioPath}`;
-        audioRef.current.play().catch(err => console.error('Audio play error:', err));
+  const loadBundles = async (audioBundles) => {
+    // One download per side; cards then seek within it instead of fetching each sentence
+    const loaded = {};
+    for (const [side, bundle] of Object.entries(audioBundles)) {
+      try {
+        const res = await fetch(`${backendUrl}${bundle.url}`);
+        const src = URL.createObjectURL(await res.blob());
+        const segments = Object.fromEntries(bundle.segments.map(seg => [seg.sentence_id, seg]));
+        loaded[side] = { src, segments };
+      } catch (error) {
+        console.error('Error loading audio bundle:', error);
       }
     }
+    setBundles(loaded);
+  };
+
+  const playCurrent = () => {
+    const audio = audioRef.current;
+    if (!audio || sentences.length === 0) return;
+    const currentSentence = sentences[currentIndex];
+    const side = showingFront ? 'target' : 'source';
+    const segment = bundles[side]?.segments[currentSentence.id];
+    if (segment) {
+      if (audio.src !== bundles[side].src) audio.src = bundles[side].src;
+      audio.currentTime = segment.start;
+      segmentRef.current = segment;
+    } else {
+      const audioPath = currentSentence[`${side}_audio`];
+      if (!audioPath) return;
+      // Ask for the smaller Opus variant where supported; the server falls back to MP3
+      const profile = audio.canPlayType('audio/ogg; codecs="opus"') ? '?profile=opus' : '';
+      audio.src = `${backendUrl}${audioPath}${profile}`;
+      segmentRef.current = null;
+    }
+    audio.play().catch(err => console.error('Audio play error:', err));
+  };
+
+  const handleTimeUpdate = () => {
+    // Stop at the end of the current sentence when playing from a bundle
+    const segment = segmentRef.current;
+    const audio = audioRef.current;
+    if (segment && audio && audio.currentTime >= segment.start + segment.duration) {
+      audio.pause();
+    }
+  };
+
+  useEffect(() => {
+    // Auto-play audio when card changes or flips
+    playCurrent();
   }, [currentIndex, showingFront, sentences]);
 
   const handleFlip = () => {
@@ -61,9 +108,7 @@ export default function StudyDeck({ studiable, onBack }) {
   };
 
   const playAudio = () => {
-    if (audioRef.current) {
-      audioRef.current.play().catch(err => console.error('Audio play error:', err));
-    }
+    playCurrent();
   };
 
   if (isLoading) {
@@ -200,7 +245,7 @@ export default function StudyDeck({ studiable, onBack }) {
       </div>
 
       {/* Hidden audio element */}
-      <audio ref={audioRef} />
+      <audio ref={audioRef} onTimeUpdate={handleTimeUpdate} />
     </div>
   );
 }